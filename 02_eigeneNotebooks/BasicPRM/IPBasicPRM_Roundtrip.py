@@ -8,6 +8,10 @@ License is based on Creative Commons: Attribution-NonCommercial 4.0 Internationa
 
 from HelperPackage import IPPRMBase
 from HelperPackage.IPPerfMonitor import IPPerfMonitor
+from HelperPackage.IPIndexedGraph import PositionIndexedGraph
+from HelperPackage.IPNearestNeighbour import IncrementalKDTree
+from HelperPackage.IPUnionFind import UnionFind
+from HelperPackage.IPPathTools import removeLoops
 import networkx as nx
 import random
 import numpy as np
@@ -22,27 +26,68 @@ class BasicPRM(IPPRMBase.PRMBase):
 
     def __init__(self, _collChecker):
         super(BasicPRM, self).__init__(_collChecker)
-        self.graph = nx.Graph()
+        self.graph = PositionIndexedGraph()
         self.reachedInterims = [] 
+        self.useKDTree = False
+        self.kdTree = IncrementalKDTree()
+        self.connectedComponents = UnionFind()
 
     
     @IPPerfMonitor
     def _inSameConnectedComponent(self, node1, node2):
         """ Check whether to nodes are part of the same connected component using
-            functionality from NetworkX
+            the union-find structure, which is updated with every new edge
         """
-        for connectedComponent in nx.connected_components(self.graph):
-            if (node1 in connectedComponent) & (node2 in connectedComponent):
-                return True
-
-        return False
+        return self.connectedComponents.connected(node1, node2)
 
     
+    def _addNode(self, nodeName, pos, **attr):
+        """ Add node to graph and, if used, to the kd-tree"""
+        self.graph.add_node(nodeName, pos=pos, **attr)
+        self.connectedComponents.add(nodeName)
+        if self.useKDTree:
+            self.kdTree.insert(nodeName, pos)
+
+    def _removeTerminals(self):
+        """ Remove start and interims of the previous query from graph, kd-tree and connected components"""
+        for node in self._terminalNodes():
+            self.graph.remove_node(node)
+            self.kdTree.remove(node)
+
+        # the union-find does not support removing nodes, so it is rebuilt from the graph
+        self._rebuildConnectedComponents()
+
+    def _rebuildConnectedComponents(self):
+        self.connectedComponents.clear()
+        for node in self.graph.nodes():
+            self.connectedComponents.add(node)
+        for node1, node2 in self.graph.edges():
+            self.connectedComponents.union(node1, node2)
+
+    def _restoreRoadmap(self, roadmapParameters, roadmap):
+        """ Rebuild kd-tree and connected components of a loaded roadmap (s. PRMBase.loadRoadmap) in bulk
+        from its arrays: one cKDTree build and the components of scipy"""
+        self.useKDTree = roadmapParameters[2] if roadmapParameters is not None else False
+        names = roadmap.nodeNames()
+        self.kdTree.clear()
+        if self.useKDTree:
+            self.kdTree.insertMany(names, roadmap.positions)
+        self.connectedComponents.clear()
+        self.connectedComponents.addComponents(names, roadmap.connectedComponents()[1].tolist())
+
+    def _addEdge(self, node1, node2):
+        """ Add edge to graph and merge the connected components of both nodes"""
+        self.graph.add_edge(node1, node2)
+        self.connectedComponents.union(node1, node2)
+
     @IPPerfMonitor
     def _nearestNeighbours(self, pos, radius):
-        """ Brute Force method to find all nodes of a 
-        graph near the given position **pos** with in the distance of
-        **radius** """
+        """ Find all nodes of a graph near the given position **pos** with in 
+        the distance of **radius**. Uses the kd-tree (sorted by distance) if 
+        config["useKDTree"] is set, otherwise brute force """
+
+        if self.useKDTree:
+            return [(node, self.graph.nodes[node]) for distance, node in self.kdTree.queryRadius(pos, radius)]
 
         result = list()
 
@@ -52,72 +97,18 @@ class BasicPRM(IPPRMBase.PRMBase):
                 
         return result
     
-    def _getNodeNamebasedOnCoordinates(self,coordinates):
-        
-        # Initialize node name
-        nodeName = ""
-        
-        # Loop through all nodes and their attributes in the graph
-        for node, attributes in self.graph.nodes(data=True):
-            # Check if the current node has a "pos" attribute
-            if "pos" in attributes:
-                # Check if the coordinates match the "pos" attribute of the current node
-                if coordinates == attributes["pos"]:
-                    # Assign the name of the current node to nodeName and exit the loop
-                    nodeName = node
-                    break
-        
-        # Return the name of the node based on the provided coordinates
-        return nodeName
-    
-    @IPPerfMonitor
-    def _nearestInterim(self,currentNode,checkedInterimGoalList):
-        
-        # List 1: Coordinates
-        # List 2: Distance
-        # List 3: Name
-        result_interim = [[],[],[]]
-        
-        # Loop over all checked interim goals
-        i = 0
-        for next_pos_node in checkedInterimGoalList:
-            
-            # Current position and position of the next interim goal
-            point_current = (currentNode[0] , currentNode[1])
-            point_pos_next = (next_pos_node[0],next_pos_node[1])
-
-            # Add coordinates and distance to the result list
-            result_interim[0].append(next_pos_node)
-            result_interim[1].append(euclidean(point_current,point_pos_next))
-            i += 1
-            
-       
-        # Assign names to the nearest points
-        for nearest in result_interim[0]:
-            for node, attributes in self.graph.nodes(data=True):
-                if "pos" in attributes:
-                    if nearest == attributes["pos"]:
-                        result_interim[2].append(node)
-                        break
-                        
-        # Find the minimum distance and the index of the nearest interim goal
-        minimum_value = min(result_interim[1])
-        minimum_index = result_interim[1].index(minimum_value)
-        
-        # Return the information of the nearest interim goal
-        return [result_interim[0][minimum_index], result_interim[1][minimum_index],result_interim[2][minimum_index]]
-            
-    
     @IPPerfMonitor
     def _learnRoadmapNearestNeighbour(self, radius, numNodes):
         """ Generate a roadmap by given number of nodes and radius, that should be tested for connection."""
+        # Generate all 'randomly chosen, free configurations' at once (batched collision checks)
+        newNodePositions = self._getRandomFreePositions(numNodes).tolist()
+
         # nodeID is used for uniquely enumerating all nodes and as their name
         nodeID = 1
         while nodeID <= numNodes:
         
-            # Generate a 'randomly chosen, free configuration'
-            newNodePos = self._getRandomFreePosition()
-            self.graph.add_node(nodeID, pos=newNodePos)
+            newNodePos = newNodePositions[nodeID - 1]
+            self._addNode(nodeID, newNodePos)
             
             # Find set of candidates to connect to sorted by distance
             result = self._nearestNeighbours(newNodePos, radius)
@@ -128,7 +119,7 @@ class BasicPRM(IPPRMBase.PRMBase):
                     continue
                 
                 if not self._collisionChecker.lineInCollision(newNodePos,data[1]['pos']):
-                    self.graph.add_edge(nodeID,data[0])
+                    self._addEdge(nodeID,data[0])
             
             nodeID += 1
     
@@ -146,6 +137,13 @@ class BasicPRM(IPPRMBase.PRMBase):
             config["radius"]   = 5.0
             config["numNodes"] = 300
             config["useKDTree"] = True
+            config["tourPlanning"] = True # optional: visit the interims in the order of the shortest tour
+                                          # through the roadmap instead of switching to the nearest interim
+            config["multiQuery"] = True # optional: keep the roadmap of the previous call (same collision checker,
+                                        # unchanged scene, same radius/numNodes/useKDTree), only start and interims
+                                        # are replaced
+            config["seed"] = 42 # optional: seed of the random generator (reproducible runs)
+            config["sampler"] = "halton" # optional: "uniform" (default), "halton", "sobol" or "grid" (s. IPSampler)
             
             startList = [[1,1]]
             goalList  = [[10,1]]
@@ -153,22 +151,35 @@ class BasicPRM(IPPRMBase.PRMBase):
             instance.planPath(startList,goalList,config)
         
         """
-        # 0. reset
-        self.graph.clear()
+        roadmapParameters = (config["radius"], config["numNodes"], config.get("useKDTree", False))
+        multiQuery = self._canReuseRoadmap(config, roadmapParameters)
+        self._initSampling(config)
+
+        # 0. reset (in multi-query mode only the terminals of the previous query are removed)
+        if multiQuery:
+            self._removeTerminals()
+        else:
+            self._forgetRoadmap()
+            self.graph.clear()
+            self.kdTree.clear()
+            self.connectedComponents.clear()
+            self.useKDTree = config.get("useKDTree", False)
         
         # 1. check start and goal whether collision free (s. BaseClass)
         checkedStartList, checkedInterimGoalList = self._checkStartGoal(startList, interimGoalList)
 
         # 2. learn Roadmap
-        self._learnRoadmapNearestNeighbour(config["radius"],config["numNodes"])
+        if not multiQuery:
+            self._learnRoadmapNearestNeighbour(config["radius"],config["numNodes"])
+            self._rememberRoadmap(roadmapParameters)
 
         # 3. find connection of start and goal to roadmap
         # find nearest, collision-free connection between node on graph and start
         result = self._nearestNeighbours(checkedStartList[0], config["radius"])
         for node in result:
             if not self._collisionChecker.lineInCollision(checkedStartList[0],node[1]['pos']):
-                 self.graph.add_node("start", pos=checkedStartList[0], color='lawngreen')
-                 self.graph.add_edge("start", node[0])
+                 self._addNode("start", checkedStartList[0], color='lawngreen')
+                 self._addEdge("start", node[0])
                  break    
 
         # Iterate through each interim goal in the list
@@ -181,12 +192,19 @@ class BasicPRM(IPPRMBase.PRMBase):
 
             for node in result:
                 if not self._collisionChecker.lineInCollision(checkedInterimGoalList[interimGoal],node[1]['pos']):
-                    self.graph.add_node(nameOfNode, pos=checkedInterimGoalList[interimGoal], color='Coral')
-                    self.graph.add_edge(nameOfNode, node[0])
+                    self._addNode(nameOfNode, checkedInterimGoalList[interimGoal], color='Coral')
+                    self._addEdge(nameOfNode, node[0])
                     break
+
+        # names of the interims are known now
+        self._initInterimTable(checkedInterimGoalList)
         
         try:
             
+            # Visit the interims in the order of the shortest tour through the roadmap
+            if config.get("tourPlanning", False):
+                return self._planTourPath(len(checkedInterimGoalList), config)
+
             # Calculate shortest distance to nearest interim from start 
             result_interim = self._nearestInterim(checkedStartList[0], checkedInterimGoalList)
             
@@ -273,6 +291,9 @@ class BasicPRM(IPPRMBase.PRMBase):
 
                         break
             
+            # Remove loops, the first visits of start and interims are kept
+            path = removeLoops(path, fixed=["start"] + ["interim" + str(i) for i in range(len(interimGoalList))])
+
             HelperClass.HelperClass.printInColor("Solution =  " + str(path), 'lawngreen')
             
         except Exception as e :
@@ -0,0 +1,156 @@
+# coding: utf-8
+
+"""
+Statistics of the results of IPBenchmarkRunner: per planner and benchmark the success rate and mean, median,
+p95 and bootstrap confidence interval of planning time, roadmap size and path length (Euclidean), and the
+comparison of two result sets (e.g. before and after a change), which flags significant differences.
+
+Command line (from the directory 02_eigeneNotebooks):
+
+    python -m HelperPackage.IPBenchmarkReport results [baselineResults]
+
+License is based on Creative Commons: Attribution-NonCommercial 4.0 International (CC BY-NC 4.0) (pls. check: http://creativecommons.org/licenses/by-nc/4.0/)
+"""
+
+from scipy import stats
+import numpy as np
+import pandas
+import argparse
+
+# metrics of the results table, lower is better for all of them. Runs without value (timeouts, path
+# length of unsolved runs) are left out
+METRICS = ("time", "roadmapNodes", "pathLength")
+
+def bootstrapInterval(values, statistic=np.mean, confidence=0.95, numResamples=2000, randomGenerator=None):
+    """ Percentile bootstrap confidence interval (low, high) of statistic (numpy function with axis argument)
+    of values. (nan, nan) for less than two values"""
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2:
+        return (np.nan, np.nan)
+    if randomGenerator is None:
+        randomGenerator = np.random.default_rng(0)
+
+    # all resamples at once: numResamples x len(values)
+    resamples = values[randomGenerator.integers(0, len(values), (numResamples, len(values)))]
+    estimates = statistic(resamples, axis=1)
+    tail = (1.0 - confidence)/2.0
+    low, high = np.quantile(estimates, [tail, 1.0 - tail])
+    return (float(low), float(high))
+
+def summarizeResults(results, metrics=METRICS, confidence=0.95, numResamples=2000, seed=0):
+    """ Return a DataFrame with one row per planner and benchmark of results (s. IPBenchmarkRunner.runBenchmarks):
+    runs, timeouts, successRate with its confidence interval (successLow, successHigh) and for every metric
+    <metric>Mean, <metric>Median, <metric>P95 and the confidence interval of the mean (<metric>Low, <metric>High)"""
+    randomGenerator = np.random.default_rng(seed)
+    result = []
+    for (plannerName, benchmarkName), group in results.groupby(["planner", "benchmark"], sort=False):
+        solved = group["solved"].astype(float).to_numpy()
+        successLow, successHigh = bootstrapInterval(solved, np.mean, confidence, numResamples, randomGenerator)
+        row = {"planner": plannerName,
+               "benchmark": benchmarkName,
+               "runs": len(group),
+               "timeouts": int((group["status"] == "timeout").sum()),
+               "successRate": solved.mean(),
+               "successLow": successLow,
+               "successHigh": successHigh}
+
+        for metric in metrics:
+            values = group[metric].dropna().to_numpy(dtype=float)
+            low, high = bootstrapInterval(values, np.mean, confidence, numResamples, randomGenerator)
+            row[metric + "Mean"] = values.mean() if len(values) else np.nan
+            row[metric + "Median"] = np.median(values) if len(values) else np.nan
+            row[metric + "P95"] = np.percentile(values, 95) if len(values) else np.nan
+            row[metric + "Low"] = low
+            row[metric + "High"] = high
+        result.append(row)
+    return pandas.DataFrame.from_dict(result)
+
+def _holm(pValues):
+    """ Holm-Bonferroni adjusted p-values (the tests of all planners, benchmarks and metrics are done at once)"""
+    pValues = np.asarray(pValues, dtype=float)
+    adjusted = np.full(len(pValues), np.nan)
+    valid = np.flatnonzero(~np.isnan(pValues))
+    running = 0.0
+    for rank, index in enumerate(valid[np.argsort(pValues[valid], kind="stable")]):
+        running = max(running, min(1.0, (len(valid) - rank)*pValues[index]))
+        adjusted[index] = running
+    return adjusted
+
+def compareResults(baseline, candidate, metrics=METRICS, alpha=0.05):
+    """ Compare two results tables (e.g. before and after a change) per planner, benchmark and metric.
+
+    The distributions of the metrics are compared with the two-sided Mann-Whitney U test, the success rates
+    with Fisher's exact test. The p-values are adjusted for multiple testing (Holm).
+
+    Returns a DataFrame with one row per planner, benchmark and metric (incl. successRate): baseline and
+    candidate (median, success rate), change (relative), effect (probability that a candidate run has a
+    higher value than a baseline run), pValue, pAdjusted, flag ("regression", "improvement" if pAdjusted < alpha)
+    and sameScene (False if the benchmark scene differs, e.g. the random scene of Circle of Death)
+    """
+    result = []
+    candidateGroups = dict(list(candidate.groupby(["planner", "benchmark"], sort=False)))
+    for key, baseGroup in baseline.groupby(["planner", "benchmark"], sort=False):
+        candGroup = candidateGroups.get(key)
+        if candGroup is None:
+            continue
+        sameScene = "sceneHash" not in baseGroup or set(baseGroup["sceneHash"]) == set(candGroup["sceneHash"])
+
+        baseSolved = int(baseGroup["solved"].sum())
+        candSolved = int(candGroup["solved"].sum())
+        table = [[baseSolved, len(baseGroup) - baseSolved], [candSolved, len(candGroup) - candSolved]]
+        pValue = stats.fisher_exact(table).pvalue
+        baseRate = baseSolved/float(len(baseGroup))
+        candRate = candSolved/float(len(candGroup))
+        result.append({"planner": key[0], "benchmark": key[1], "metric": "successRate",
+                       "baseline": baseRate, "candidate": candRate,
+                       "change": candRate/baseRate - 1.0 if baseRate > 0 else np.nan,
+                       "effect": np.nan, "pValue": pValue, "sameScene": sameScene,
+                       "worse": np.sign(baseRate - candRate)})
+
+        for metric in metrics:
+            baseValues = baseGroup[metric].dropna().to_numpy(dtype=float)
+            candValues = candGroup[metric].dropna().to_numpy(dtype=float)
+            if len(baseValues) == 0 or len(candValues) == 0:
+                continue
+            baseMedian = np.median(baseValues)
+            candMedian = np.median(candValues)
+            if np.all(baseValues == baseValues[0]) and np.all(candValues == baseValues[0]):
+                # identical constant samples, the test is not defined
+                pValue, effect = 1.0, 0.5
+            else:
+                test = stats.mannwhitneyu(candValues, baseValues, alternative="two-sided")
+                pValue, effect = test.pvalue, test.statistic/float(len(candValues)*len(baseValues))
+            result.append({"planner": key[0], "benchmark": key[1], "metric": metric,
+                           "baseline": baseMedian, "candidate": candMedian,
+                           "change": candMedian/baseMedian - 1.0 if baseMedian != 0 else np.nan,
+                           "effect": effect, "pValue": pValue, "sameScene": sameScene,
+                           "worse": np.sign(effect - 0.5)})
+
+    comparison = pandas.DataFrame.from_dict(result)
+    if comparison.empty:
+        return comparison
+
+    # worse: +1 if the candidate is worse (lower success rate, higher values), -1 if better
+    comparison["pAdjusted"] = _holm(comparison["pValue"])
+    significant = comparison["pAdjusted"] < alpha
+    comparison["flag"] = ""
+    comparison.loc[significant & (comparison["worse"] > 0), "flag"] = "regression"
+    comparison.loc[significant & (comparison["worse"] < 0), "flag"] = "improvement"
+    return comparison.drop(columns="worse")
+
+def main(arguments=None):
+    from HelperPackage.IPBenchmarkRunner import loadResults
+
+    parser = argparse.ArgumentParser(description="Statistics of benchmark results of IPBenchmarkRunner")
+    parser.add_argument("results", help="results directory")
+    parser.add_argument("baseline", nargs="?", default=None, help="results directory to compare with")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    args = parser.parse_args(arguments)
+
+    results = loadResults(args.results)[0]
+    print(summarizeResults(results).to_string())
+    if args.baseline is not None:
+        print(compareResults(loadResults(args.baseline)[0], results, alpha=args.alpha).to_string())
+
+if __name__ == "__main__":
+    main()
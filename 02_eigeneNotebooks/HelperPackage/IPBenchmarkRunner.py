@@ -0,0 +1,206 @@
+# coding: utf-8
+
+"""
+Runs every planner of a planner factory on the benchmarks of IPTestSuite.benchList, repeatedly with different
+seeds, in parallel worker processes. Replaces the serial loop of the PerformanceTest notebook.
+
+Every job (planner, benchmark, seed) runs in a worker of a ProcessPoolExecutor with a time limit. The results
+(one row per job) and the perf stats of IPPerfMonitor (one row per job and monitored function) are returned as
+DataFrames and can be written to a results directory (Parquet, if available, otherwise CSV), together with
+the statistics of IPBenchmarkReport.summarizeResults.
+
+Command line (from the directory 02_eigeneNotebooks):
+
+    python -m HelperPackage.IPBenchmarkRunner --repetitions 75 --timeout 60 --out results
+    python -m HelperPackage.IPBenchmarkRunner --repetitions 75 --out resultsNew --baseline results
+
+License is based on Creative Commons: Attribution-NonCommercial 4.0 International (CC BY-NC 4.0) (pls. check: http://creativecommons.org/licenses/by-nc/4.0/)
+"""
+
+from HelperPackage.IPPerfMonitor import IPPerfMonitor
+from HelperPackage.IPPerfBenchmarks import RunTimeout, timeLimit
+from HelperPackage.IPRoadmapIO import sceneHash
+from HelperPackage.IPPathTools import pathLength
+from HelperPackage.IPBenchmarkReport import summarizeResults, compareResults
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas
+import argparse
+import contextlib
+import copy
+import io
+import os
+import random
+import time
+
+def defaultPlannerFactory():
+    """ Planners and configs of the PerformanceTest notebook: name -> (planner class, config)"""
+    from BasicPRM.IPBasicPRM_Roundtrip import BasicPRM
+    from VisibilityPRM import IPVisibilityPRM_Roundtrip, CC_IPVisibilityPRM_Roundtrip
+    from LazyPRM.IPLazyPRM_Roundtrip import LazyPRM
+
+    plannerFactory = dict()
+    plannerFactory["basePRM"] = (BasicPRM, {"radius": 3, "numNodes": 200})
+    plannerFactory["visibilityPRM"] = (IPVisibilityPRM_Roundtrip.VisPRM, {"ntry": 300})
+    plannerFactory["visibilityPRMOptimized"] = (CC_IPVisibilityPRM_Roundtrip.VisPRM, {"ntry": 300})
+    plannerFactory["lazyPRM"] = (LazyPRM, {"initialRoadmapSize": 10, "updateRoadmapSize": 5, "kNearest": 8})
+    return plannerFactory
+
+# benchmarks of IPTestSuite by name, built once per worker process, so jobs only carry the benchmark name
+_benchmarks = None
+
+def _benchmark(name):
+    global _benchmarks
+    if _benchmarks is None:
+        from HelperPackage import IPTestSuite
+        _benchmarks = {benchmark.name: benchmark for benchmark in IPTestSuite.benchList}
+    return _benchmarks[name]
+
+def _runJob(job):
+    """ Run one job (dict with plannerName, plannerClass, config, benchmark, seed, repetition, timeout) and
+    return (result row, perf stat rows). Executed in the worker processes"""
+    benchmark = _benchmark(job["benchmark"])
+    runId = job["plannerName"] + "/" + job["benchmark"] + "/" + str(job["seed"])
+
+    # seed everything a planner may use (config["seed"] for the samplers of PRMBase)
+    random.seed(job["seed"])
+    np.random.seed(job["seed"] % 2**32)
+    config = dict(job["config"])
+    config["seed"] = job["seed"]
+
+    # the scene of some benchmarks is random (Circle of Death), the hash tells which runs are comparable
+    result = {"planner": job["plannerName"], "benchmark": job["benchmark"], "seed": job["seed"],
+              "repetition": job["repetition"], "sceneHash": sceneHash(benchmark.collisionChecker)[:16],
+              "status": "ok", "solved": False, "time": np.nan, "roadmapNodes": np.nan, "roadmapEdges": np.nan,
+              "pathNodes": np.nan, "pathLength": np.nan}
+    planner = None
+    starttime = time.perf_counter()
+    try:
+        with IPPerfMonitor.run(runId, planner=job["plannerName"], benchmark=job["benchmark"], seed=job["seed"]):
+            with timeLimit(job["timeout"]), contextlib.redirect_stdout(io.StringIO()):
+                planner = job["plannerClass"](benchmark.collisionChecker)
+                solution = planner.planRoundPath(copy.deepcopy(benchmark.startList), copy.deepcopy(benchmark.interimGoalList), config)
+        result["time"] = time.perf_counter() - starttime
+        result["solved"] = solution != []
+        result["pathNodes"] = len(solution)
+        if solution != []:
+            result["pathLength"] = pathLength(planner.graph, solution)
+    except RunTimeout:
+        result["status"] = "timeout"
+    except Exception as e:
+        result["status"] = "error: " + repr(e)
+
+    graph = getattr(planner, "graph", None)
+    if graph is not None:
+        result["roadmapNodes"] = graph.number_of_nodes()
+        result["roadmapEdges"] = graph.number_of_edges()
+
+    perfStats = IPPerfMonitor.summary(runId).to_dict("records")
+    IPPerfMonitor.clearData(runId)
+    return result, perfStats
+
+def runBenchmarks(plannerFactory=None, benchmarkNames=None, repetitions=1, seed=0, timeout=60.0, workers=None):
+    """ Run every planner of plannerFactory on every benchmark repetitions times.
+
+    Args:
+        :plannerFactory: name -> (planner class, config, ...) as in the PerformanceTest notebook (default
+                         s. defaultPlannerFactory). Classes have to be importable by the worker processes
+        :benchmarkNames: names of the benchmarks of IPTestSuite.benchList (default all)
+        :repetitions: runs per planner and benchmark, repetition i uses config["seed"] = seed + i (the same
+                      seeds for all planners). Runs are reproducible for the same PYTHONHASHSEED, the path
+                      search of the planners depends on the iteration order of sets
+        :timeout: seconds per run, longer runs are aborted (status "timeout")
+        :workers: number of worker processes (default number of CPUs), 1 runs all jobs in this process
+
+    Returns (results, perfStats): DataFrame with one row per run (planner, benchmark, seed, repetition,
+    sceneHash, status, solved, time, roadmapNodes, roadmapEdges, pathNodes, pathLength) and DataFrame of
+    IPPerfMonitor.summary per run (name, run, planner, benchmark, seed, calls, time, ...)
+    """
+    if plannerFactory is None:
+        plannerFactory = defaultPlannerFactory()
+    if benchmarkNames is None:
+        from HelperPackage import IPTestSuite
+        benchmarkNames = [benchmark.name for benchmark in IPTestSuite.benchList]
+
+    jobs = []
+    for repetition in range(repetitions):
+        for plannerName, producer in plannerFactory.items():
+            for benchmarkName in benchmarkNames:
+                jobs.append({"plannerName": plannerName, "plannerClass": producer[0], "config": producer[1],
+                             "benchmark": benchmarkName, "seed": seed + repetition, "repetition": repetition,
+                             "timeout": timeout})
+
+    outcomes = [None]*len(jobs)
+    if workers == 1:
+        for index, job in enumerate(jobs):
+            outcomes[index] = _runJob(job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_runJob, job): index for index, job in enumerate(jobs)}
+            for future in as_completed(futures):
+                outcomes[futures[future]] = future.result()
+
+    results = pandas.DataFrame.from_dict([result for result, perfStats in outcomes])
+    perfStats = pandas.DataFrame.from_dict([row for result, perfStats in outcomes for row in perfStats])
+    return results, perfStats
+
+def _writeTable(table, fileNameWithoutExtension, fileFormat):
+    # Parquet needs pyarrow or fastparquet, without them the table is written as CSV
+    if fileFormat == "parquet":
+        try:
+            table.to_parquet(fileNameWithoutExtension + ".parquet", index=False)
+            return fileNameWithoutExtension + ".parquet"
+        except ImportError:
+            pass
+    table.to_csv(fileNameWithoutExtension + ".csv", index=False)
+    return fileNameWithoutExtension + ".csv"
+
+def saveResults(path, results, perfStats, fileFormat="parquet"):
+    """ Write results and perfStats of runBenchmarks to the directory path (results.parquet/.csv and
+    perfStats.parquet/.csv, CSV if Parquet is not available). Returns the written file names"""
+    os.makedirs(path, exist_ok=True)
+    return [_writeTable(results, os.path.join(path, "results"), fileFormat),
+            _writeTable(perfStats, os.path.join(path, "perfStats"), fileFormat)]
+
+def _readTable(fileNameWithoutExtension):
+    if os.path.exists(fileNameWithoutExtension + ".parquet"):
+        return pandas.read_parquet(fileNameWithoutExtension + ".parquet")
+    return pandas.read_csv(fileNameWithoutExtension + ".csv")
+
+def loadResults(path):
+    """ Return (results, perfStats) saved with saveResults in the directory path"""
+    return _readTable(os.path.join(path, "results")), _readTable(os.path.join(path, "perfStats"))
+
+def main(arguments=None):
+    plannerFactory = defaultPlannerFactory()
+
+    parser = argparse.ArgumentParser(description="Run the PRM planners on the benchmarks of IPTestSuite in parallel")
+    parser.add_argument("--planners", nargs="+", choices=list(plannerFactory), default=list(plannerFactory))
+    parser.add_argument("--benchmarks", nargs="+", default=None, help="benchmark names (default all)")
+    parser.add_argument("--repetitions", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first repetition")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds per run")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default number of CPUs)")
+    parser.add_argument("--out", default="benchmarkResults", help="results directory")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--baseline", default=None, help="results directory to compare with (s. IPBenchmarkReport)")
+    args = parser.parse_args(arguments)
+
+    starttime = time.perf_counter()
+    results, perfStats = runBenchmarks({name: plannerFactory[name] for name in args.planners}, args.benchmarks,
+                                       args.repetitions, args.seed, args.timeout, args.workers)
+    fileNames = saveResults(args.out, results, perfStats, args.format)
+    summary = summarizeResults(results)
+    fileNames.append(_writeTable(summary, os.path.join(args.out, "summary"), args.format))
+
+    print(summary[["planner", "benchmark", "runs", "successRate", "timeMean", "timeMedian", "timeP95",
+                   "roadmapNodesMean", "pathLengthMean"]].to_string())
+    if args.baseline is not None:
+        comparison = compareResults(loadResults(args.baseline)[0], results)
+        flagged = comparison[comparison["flag"] != ""] if not comparison.empty else comparison
+        print(flagged.to_string() if not flagged.empty else "No significant differences to " + args.baseline)
+    print(str(len(results)) + " runs in " + str(round(time.perf_counter() - starttime, 1)) + "s, written to " + ", ".join(fileNames))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# coding: utf-8
+
+"""
+Cache layer for collision checkers. Planners re-check the same edges several times during
+the roundtrip planning, these repeated queries are answered from the cache.
+
+License is based on Creative Commons: Attribution-NonCommercial 4.0 International (CC BY-NC 4.0) (pls. check: http://creativecommons.org/licenses/by-nc/4.0/)
+"""
+
+from collections import OrderedDict
+
+class CachedCollisionChecker(object):
+    """ Bounded LRU cache in front of a collision checker for segment queries.
+
+    The cache is symmetric, (a, b) and (b, a) share one entry. All other attributes
+    (getDim, pointInCollision, drawObstacles, ...) are forwarded to the wrapped checker.
+    The cache is cleared automatically, if the scene of the wrapped checker changes.
+
+    Example:
+
+        planner = BasicPRM(CachedCollisionChecker(benchmark.collisionChecker))
+    """
+
+    def __init__(self, collisionChecker, maxSize=100000):
+        """
+        Args:
+            :collisionChecker: checker to be wrapped (CollisionChecker, GridCollisionChecker, ...)
+            :maxSize: maximal number of cached edges, the least recently used edge is dropped first
+        """
+        self.collisionChecker = collisionChecker
+        self.maxSize = maxSize
+        self.clearCache()
+
+    def __getattr__(self, name):
+        # only called for attributes not found on the cache itself
+        if name.startswith("__") or name == "collisionChecker":
+            raise AttributeError(name)
+        return getattr(self.collisionChecker, name)
+
+    def clearCache(self):
+        """ Drop all cached edges and reset the statistics"""
+        self._cache = OrderedDict()
+        self._sceneVersion = self.collisionChecker.sceneVersion
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def cacheInfo(self):
+        """ Return hit/miss statistics of the cache"""
+        queries = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._cache),
+                "maxSize": self.maxSize,
+                "hitRate": self.hits/queries if queries > 0 else 0.0}
+
+    def lineInCollision(self, startPos, endPos):
+        """ Check whether a line from startPos to endPos is colliding (cached)"""
+        if self.collisionChecker.sceneVersion != self._sceneVersion:
+            self.clearCache()
+
+        # the order of the end points does not matter
+        p1 = tuple(startPos)
+        p2 = tuple(endPos)
+        key = (p1, p2) if p1 <= p2 else (p2, p1)
+
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return self._cache[key]
+
+        self.misses += 1
+        result = self.collisionChecker.lineInCollision(startPos, endPos)
+        self._cache[key] = result
+
+        if len(self._cache) > self.maxSize:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+        return result
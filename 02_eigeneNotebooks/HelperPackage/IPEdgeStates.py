@@ -0,0 +1,73 @@
+# coding: utf-8
+
+"""
+Registry of the collision state of roadmap edges, which have already been checked.
+
+License is based on Creative Commons: Attribution-NonCommercial 4.0 International (CC BY-NC 4.0) (pls. check: http://creativecommons.org/licenses/by-nc/4.0/)
+"""
+
+class EdgeStateRegistry(object):
+    """ Collision state of unordered node pairs with O(1) lookup.
+
+    (a, b) and (b, a) share one entry. Every edge is either UNKNOWN (not checked yet), FREE or
+    COLLIDING. The edges are kept in the order they were checked first, in the orientation
+    they were registered with (used for visualization).
+    """
+
+    UNKNOWN = 0
+    FREE = 1
+    COLLIDING = 2
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """ Forget all edges"""
+        self._edges = dict()  # frozenset of both nodes -> (state, (node1, node2))
+        self._keysOfNode = dict()  # node -> set of the keys of its edges
+
+    def __len__(self):
+        return len(self._edges)
+
+    def __contains__(self, edge):
+        return frozenset(edge) in self._edges
+
+    def state(self, node1, node2):
+        """ Return FREE, COLLIDING or UNKNOWN for the edge between node1 and node2"""
+        entry = self._edges.get(frozenset((node1, node2)))
+        if entry is None:
+            return self.UNKNOWN
+        return entry[0]
+
+    def isFree(self, node1, node2):
+        return self.state(node1, node2) == self.FREE
+
+    def isColliding(self, node1, node2):
+        return self.state(node1, node2) == self.COLLIDING
+
+    def setState(self, node1, node2, state):
+        """ Store the state of the edge (the orientation of the first registration is kept)"""
+        key = frozenset((node1, node2))
+        entry = self._edges.get(key)
+        edge = entry[1] if entry is not None else (node1, node2)
+        self._edges[key] = (state, edge)
+        self._keysOfNode.setdefault(node1, set()).add(key)
+        self._keysOfNode.setdefault(node2, set()).add(key)
+
+    def removeNode(self, node):
+        """ Forget all edges of node (e.g. if the node name is used for a different position later)"""
+        for key in self._keysOfNode.pop(node, ()):
+            del self._edges[key]
+            for other in key:
+                if other != node:
+                    self._keysOfNode[other].discard(key)
+
+    def markFree(self, node1, node2):
+        self.setState(node1, node2, self.FREE)
+
+    def markColliding(self, node1, node2):
+        self.setState(node1, node2, self.COLLIDING)
+
+    def edges(self, state):
+        """ Return list of all edges (node1, node2) with the given state (O(number of edges))"""
+        return [edge for edgeState, edge in self._edges.values() if edgeState == state]
@@ -11,14 +11,114 @@ from HelperPackage.IPPerfMonitor import IPPerfMonitor
 import matplotlib.pyplot as plt
 
 from shapely.geometry import Point, Polygon, LineString
+from shapely.ops import unary_union
+from shapely.prepared import prep
+from shapely.strtree import STRtree
 from descartes.patch import PolygonPatch
 import numpy as np
+import types
+
+try:
+    # shapely >= 2.0 offers vectorized predicates on coordinate arrays
+    from shapely import intersects_xy, points, prepare
+except ImportError:
+    intersects_xy = None
 
 class CollisionChecker(object):
 
-    def __init__(self, scene, limits=[[0.0, 22.0], [0.0, 22.0]], statistic=None):
-        self.scene = scene
+    lineCheckModes = ("sampling", "exact")
+    sceneIndices = ("union", "strtree")
+
+    # spatial index built by _prepareScene, prepared geometries can not be pickled
+    _derivedFields = ("_sceneGeometry", "_preparedScene", "_obstacles", "_preparedObstacles", "_obstacleIndex", "_sceneTree")
+
+    def __init__(self, scene, limits=[[0.0, 22.0], [0.0, 22.0]], statistic=None, lineCheckMode="sampling", sceneIndex="union"):
+        """
+        Args:
+            :scene: dict of shapely obstacles
+            :limits: limits of the environment
+            :lineCheckMode: "sampling" tests 40 points along an edge, "exact" intersects the
+                            whole segment with the obstacles
+            :sceneIndex: "union" merges all obstacles into one prepared geometry (fastest queries),
+                         "strtree" only tests the obstacles whose bounding box is hit (fastest setup
+                         for scenes with thousands of obstacles)
+        """
+        if lineCheckMode not in CollisionChecker.lineCheckModes:
+            raise ValueError("Unknown lineCheckMode: " + str(lineCheckMode))
+        if sceneIndex not in CollisionChecker.sceneIndices:
+            raise ValueError("Unknown sceneIndex: " + str(sceneIndex))
+        self.lineCheckMode = lineCheckMode
+        self.sceneIndex = sceneIndex
         self.limits = limits
+        self.sceneVersion = 0
+        self.scene = scene
+
+    @property
+    def scene(self):
+        """ Read-only view of the obstacles (name -> shapely geometry). The spatial index and the caches of the
+        planners are built for it, so in-place edits raise a TypeError instead of giving stale collision
+        results. To change the obstacles assign a new dict: checker.scene = dict(checker.scene, newName=geometry)"""
+        return types.MappingProxyType(self._scene)
+
+    @scene.setter
+    def scene(self, scene):
+        # own copy, later edits of the dict of the caller do not bypass the index
+        self._scene = dict(scene)
+        self.sceneChanged()
+
+    def sceneChanged(self):
+        """ Rebuild the index over the obstacles (done by assigning scene).
+        Increments sceneVersion, so caches depending on the scene can invalidate themselves."""
+        self._prepareScene()
+        self.sceneVersion += 1
+
+    def _prepareScene(self):
+        """ Build the spatial index over the obstacles, which is used by all queries"""
+        obstacles = list(self._scene.values())
+
+        if self.sceneIndex == "union":
+            # prepared geometries keep an internal index over their edges
+            self._sceneGeometry = unary_union(obstacles)
+            self._preparedScene = prep(self._sceneGeometry)
+            return
+
+        self._obstacles = np.empty(len(obstacles), dtype=object)
+        self._obstacles[:] = obstacles
+        if intersects_xy is not None:
+            prepare(self._obstacles)
+        self._preparedObstacles = [prep(obstacle) for obstacle in obstacles]
+        self._obstacleIndex = {id(obstacle): i for i, obstacle in enumerate(obstacles)}
+        self._sceneTree = STRtree(obstacles)
+
+    def __getstate__(self):
+        # copy.deepcopy and pickle only keep the scene, the index is rebuilt by __setstate__
+        state = self.__dict__.copy()
+        for field in CollisionChecker._derivedFields:
+            state.pop(field, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._prepareScene()
+
+    def _candidateObstacles(self, geometry):
+        """ Return indices of all obstacles whose bounding box intersects the geometry"""
+        candidates = self._sceneTree.query(geometry)
+        if intersects_xy is not None:
+            return candidates
+
+        # shapely 1.x returns the geometries themselves
+        return [self._obstacleIndex[id(candidate)] for candidate in candidates]
+
+    def _geometryInCollision(self, geometry):
+        """ Return whether the geometry intersects any obstacle"""
+        if self.sceneIndex == "union":
+            return self._preparedScene.intersects(geometry)
+
+        for i in self._candidateObstacles(geometry):
+            if self._preparedObstacles[i].intersects(geometry):
+                return True
+        return False
 
     def getDim(self):
         """ Return dimension of Environment (Shapely should currently always be 2)"""
@@ -34,10 +134,29 @@ class CollisionChecker(object):
         inCollision -> True
         Free -> False """
         assert (len(pos) == self.getDim())
-        for key, value in self.scene.items():
-            if value.intersects(Point(pos[0], pos[1])):
-                return True
-        return False
+        return self._geometryInCollision(Point(pos[0], pos[1]))
+
+    @IPPerfMonitor
+    def pointsInCollision(self, posArray):
+        """ Return a boolean mask for an array of configurations (shape Nx2)
+        inCollision -> True
+        Free -> False """
+        posArray = np.asarray(posArray, dtype=float)
+        assert (posArray.ndim == 2 and posArray.shape[1] == self.getDim())
+
+        if intersects_xy is None:
+            # fallback for shapely 1.x: test point by point
+            return np.array([self._geometryInCollision(Point(x, y)) for x, y in posArray], dtype=bool)
+
+        if self.sceneIndex == "union":
+            return intersects_xy(self._sceneGeometry, posArray[:, 0], posArray[:, 1])
+
+        # test every point only against the obstacles whose bounding box contains it
+        pointIndices, obstacleIndices = self._sceneTree.query(points(posArray))
+        hits = intersects_xy(self._obstacles[obstacleIndices], posArray[pointIndices, 0], posArray[pointIndices, 1])
+        result = np.zeros(len(posArray), dtype=bool)
+        result[pointIndices[hits]] = True
+        return result
 
     @IPPerfMonitor
     def lineInCollision(self, startPos, endPos):
@@ -45,24 +164,25 @@ class CollisionChecker(object):
 
         assert (len(startPos) == self.getDim())
         assert (len(endPos) == self.getDim())
-        
+
+        if self.lineCheckMode == "exact":
+            return self._segmentInCollision(startPos, endPos)
+
         p1 = np.array(startPos)
         p2 = np.array(endPos)
         p12 = p2-p1
         k = 40
-        #print("testing")
-        for i in range(k):
-            testPoint = p1 + (i+1)/k*p12
-            if self.pointInCollision(testPoint)==True:
-                return True
-        
-        return False
-                
 
-#        for key, value in self.scene.items():
-#            if value.intersects(LineString([(startPos[0], startPos[1]), (endPos[0], endPos[1])])):
- #               return True
-#        return False
+        # test all k sub-samples with one batched query
+        testPoints = p1 + (np.arange(1, k+1)/k)[:, np.newaxis]*p12
+        return bool(self.pointsInCollision(testPoints).any())
+
+    def _segmentInCollision(self, startPos, endPos):
+        """ Exact test of the whole segment against the obstacles (no discretization)"""
+        if list(startPos) == list(endPos):
+            return self._geometryInCollision(Point(startPos[0], startPos[1]))
+
+        return self._geometryInCollision(LineString([(startPos[0], startPos[1]), (endPos[0], endPos[1])]))
 
     def drawObstacles(self, ax):
         for key, value in self.scene.items():
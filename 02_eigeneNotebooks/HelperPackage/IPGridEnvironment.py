@@ -0,0 +1,169 @@
+# coding: utf-8
+
+"""
+Collision checker working on a rasterized version of the scene. It offers the same interface as
+the CollisionChecker in IPEnvironment, so it can be handed to every planner without changes.
+
+License is based on Creative Commons: Attribution-NonCommercial 4.0 International (CC BY-NC 4.0) (pls. check: http://creativecommons.org/licenses/by-nc/4.0/)
+"""
+
+from HelperPackage.IPPerfMonitor import IPPerfMonitor
+from HelperPackage.IPEnvironment import CollisionChecker
+
+from shapely.geometry import Point
+from shapely.prepared import prep
+from scipy.ndimage import distance_transform_edt
+import numpy as np
+import math
+
+try:
+    # shapely >= 2.0 offers vectorized predicates on coordinate arrays
+    from shapely import intersects_xy
+except ImportError:
+    intersects_xy = None
+
+class GridCollisionChecker(CollisionChecker):
+    """ Occupancy grid and signed distance field of a scene.
+
+    Obstacles are inflated by one cell size before rasterization, so the grid is conservative:
+    every configuration colliding with the scene is also colliding with the grid.
+    """
+
+    def __init__(self, scene, limits=[[0.0, 22.0], [0.0, 22.0]], statistic=None, resolution=0.05):
+        """
+        Args:
+            :scene: dict of shapely obstacles
+            :limits: limits of the environment
+            :resolution: edge length of one grid cell
+        """
+        self.resolution = float(resolution)
+        super(GridCollisionChecker, self).__init__(scene, limits, statistic)
+
+    def _prepareScene(self):
+        super(GridCollisionChecker, self)._prepareScene()
+        self._rasterizeScene()
+
+    def _rasterizeScene(self):
+        """ Compute occupancy grid and signed distance field (in units of the environment)"""
+        self._lower = np.array([limit[0] for limit in self.limits], dtype=float)
+        self._upper = np.array([limit[1] for limit in self.limits], dtype=float)
+        shape = np.maximum(np.ceil((self._upper - self._lower)/self.resolution).astype(int), 1)
+
+        # test the cell centers against the inflated obstacles
+        axes = [self._lower[i] + (np.arange(shape[i]) + 0.5)*self.resolution for i in range(len(shape))]
+        cellCenters = np.stack([axis.ravel() for axis in np.meshgrid(*axes, indexing="ij")], axis=1)
+        inflatedScene = self._sceneGeometry.buffer(self.resolution)
+        self.occupancy = self._cellsInCollision(inflatedScene, cellCenters).reshape(shape)
+
+        if not self.occupancy.any():
+            self.distanceField = np.full(shape, np.inf)
+        else:
+            # positive: distance of a free cell to the next occupied cell, negative: inside an obstacle
+            freeDistance = distance_transform_edt(~self.occupancy)*self.resolution
+            obstacleDistance = distance_transform_edt(self.occupancy)*self.resolution
+            self.distanceField = np.where(self.occupancy, -obstacleDistance, freeDistance)
+
+        # plain python copies for the single queries, indexing them is much cheaper than numpy scalar access
+        self._distanceRows = self.distanceField.tolist()
+        self._lowerList = self._lower.tolist()
+        self._upperList = self._upper.tolist()
+        self._maxIndex = (shape[0] - 1, shape[1] - 1)
+
+    @staticmethod
+    def _cellsInCollision(geometry, cellCenters):
+        """ Boolean mask of the cell centers intersecting geometry. Not monitored by IPPerfMonitor, building
+        the grid is setup and no collision check of a planner"""
+        if intersects_xy is not None:
+            return intersects_xy(geometry, cellCenters[:, 0], cellCenters[:, 1])
+
+        # fallback for shapely 1.x: test every cell center against the prepared geometry
+        preparedGeometry = prep(geometry)
+        return np.array([preparedGeometry.intersects(Point(x, y)) for x, y in cellCenters], dtype=bool)
+
+    def _cellIndex(self, pos):
+        """ Return the grid index of a single position or None, if it is outside of the grid"""
+        i = int((pos[0] - self._lowerList[0])/self.resolution)
+        j = int((pos[1] - self._lowerList[1])/self.resolution)
+        if not (self._lowerList[0] <= pos[0] <= self._upperList[0] and self._lowerList[1] <= pos[1] <= self._upperList[1]):
+            return None
+        return min(i, self._maxIndex[0]), min(j, self._maxIndex[1])
+
+    def signedDistance(self, pos):
+        """ Return the (approximate) signed distance of a configuration to the obstacles"""
+        index = self._cellIndex(pos)
+        if index is None:
+            return np.nan
+        return self._distanceRows[index[0]][index[1]]
+
+    @IPPerfMonitor
+    def pointInCollision(self, pos):
+        """ Return whether a configuration is
+        inCollision -> True
+        Free -> False """
+        assert (len(pos) == self.getDim())
+        index = self._cellIndex(pos)
+        if index is None:
+            # outside of the grid use the exact geometry
+            return self._geometryInCollision(Point(pos[0], pos[1]))
+        return self._distanceRows[index[0]][index[1]] <= 0.0
+
+    @IPPerfMonitor
+    def pointsInCollision(self, posArray):
+        """ Return a boolean mask for an array of configurations (shape Nx2)
+        inCollision -> True
+        Free -> False """
+        posArray = np.asarray(posArray, dtype=float)
+        assert (posArray.ndim == 2 and posArray.shape[1] == self.getDim())
+
+        inside = np.all((posArray >= self._lower) & (posArray <= self._upper), axis=1)
+        indices = np.floor((posArray - self._lower)/self.resolution).astype(int)
+        indices = np.clip(indices, 0, np.array(self.occupancy.shape) - 1)
+
+        result = self.occupancy[tuple(indices.T)]
+        for i in np.flatnonzero(~inside):
+            result[i] = self._geometryInCollision(Point(posArray[i, 0], posArray[i, 1]))
+        return result
+
+    @IPPerfMonitor
+    def lineInCollision(self, startPos, endPos):
+        """ Check whether a line from startPos to endPos is colliding.
+
+        Uses sphere tracing on the distance field: the next test position is as far away as the
+        clearance of the current one allows, but at least half a cell.
+        """
+        assert (len(startPos) == self.getDim())
+        assert (len(endPos) == self.getDim())
+
+        startIndex = self._cellIndex(startPos)
+        if startIndex is None or self._cellIndex(endPos) is None:
+            return self._segmentInCollision(startPos, endPos)
+
+        # work on plain floats, numpy calls per step would dominate the run time
+        x0 = float(startPos[0]) - self._lowerList[0]
+        y0 = float(startPos[1]) - self._lowerList[1]
+        dx = float(endPos[0]) - float(startPos[0])
+        dy = float(endPos[1]) - float(startPos[1])
+        length = math.hypot(dx, dy)
+        if length == 0.0:
+            return self._distanceRows[startIndex[0]][startIndex[1]] <= 0.0
+        dx /= length
+        dy /= length
+
+        maxI, maxJ = self._maxIndex
+        resolution = self.resolution
+        distanceField = self._distanceRows
+        # distance of a position to its cell center is at most half the cell diagonal,
+        # which holds for the position and the next obstacle cell as well
+        cellDiagonal = math.sqrt(self.getDim())*resolution
+        minStep = resolution/2
+
+        t = 0.0
+        while True:
+            i = min(int((x0 + t*dx)/resolution), maxI)
+            j = min(int((y0 + t*dy)/resolution), maxJ)
+            clearance = distanceField[i][j]
+            if clearance <= 0.0:
+                return True
+            if t >= length:
+                return False
+            t = min(t + max(clearance - cellDiagonal, minStep), length)
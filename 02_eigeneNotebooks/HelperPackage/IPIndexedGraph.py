@@ -0,0 +1,88 @@
+# coding: utf-8
+
+"""
+NetworkX graph with an additional index from node position to node name.
+
+License is based on Creative Commons: Attribution-NonCommercial 4.0 International (CC BY-NC 4.0) (pls. check: http://creativecommons.org/licenses/by-nc/4.0/)
+"""
+
+import networkx as nx
+
+class PositionIndexedGraph(nx.Graph):
+    """ networkx.Graph, which keeps a dict from the 'pos' attribute of a node to its name.
+
+    The index is updated by add_node(s_from), remove_node(s_from) and clear, so the reverse
+    lookup nodeAtPos is O(1) instead of a scan over all nodes. Changing the 'pos' attribute
+    directly via graph.nodes[n]['pos'] is not tracked, use add_node(n, pos=...) instead.
+    """
+
+    def __init__(self, incoming_graph_data=None, **attr):
+        self._posIndex = dict()
+        super(PositionIndexedGraph, self).__init__(incoming_graph_data, **attr)
+
+    def _indexNode(self, node):
+        pos = self._node[node].get("pos")
+        if pos is not None:
+            self._posIndex.setdefault(tuple(pos), []).append(node)
+
+    def _unindexNode(self, node):
+        pos = self._node[node].get("pos")
+        if pos is None:
+            return
+        nodes = self._posIndex[tuple(pos)]
+        nodes.remove(node)
+        if nodes == []:
+            del self._posIndex[tuple(pos)]
+
+    def rebuildIndex(self):
+        """ Rebuild the index from the 'pos' attributes of all nodes (after the node dict was filled directly)"""
+        nodes = [node for node, attr in self._node.items() if attr.get("pos") is not None]
+        positions = [tuple(self._node[node]["pos"]) for node in nodes]
+
+        # one list per position, built in one step if all positions are distinct
+        self._posIndex = dict(zip(positions, map(list, zip(nodes))))
+        if len(self._posIndex) < len(nodes):
+            self._posIndex = dict()
+            for pos, node in zip(positions, nodes):
+                self._posIndex.setdefault(pos, []).append(node)
+
+    def nodeAtPos(self, pos, default=None):
+        """ Return the (first added) node at position pos or default, if there is none"""
+        nodes = self._posIndex.get(tuple(pos))
+        if nodes:
+            return nodes[0]
+        return default
+
+    def add_node(self, node_for_adding, **attr):
+        if node_for_adding in self._node:
+            self._unindexNode(node_for_adding)
+        super(PositionIndexedGraph, self).add_node(node_for_adding, **attr)
+        self._indexNode(node_for_adding)
+
+    def add_nodes_from(self, nodes_for_adding, **attr):
+        for n in nodes_for_adding:
+            try:
+                # same convention as networkx: either a node or a (node, attribute dict) tuple
+                n in self._node
+                self.add_node(n, **attr)
+            except TypeError:
+                n, ndict = n
+                newdict = attr.copy()
+                newdict.update(ndict)
+                self.add_node(n, **newdict)
+
+    def remove_node(self, n):
+        if n in self._node:
+            self._unindexNode(n)
+        super(PositionIndexedGraph, self).remove_node(n)
+
+    def remove_nodes_from(self, nodes):
+        nodes = list(dict.fromkeys(nodes))
+        for n in nodes:
+            if n in self._node:
+                self._unindexNode(n)
+        super(PositionIndexedGraph, self).remove_nodes_from(nodes)
+
+    def clear(self):
+        super(PositionIndexedGraph, self).clear()
+        self._posIndex.clear()
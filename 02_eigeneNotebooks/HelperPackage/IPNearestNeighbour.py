@@ -0,0 +1,180 @@
+# coding: utf-8
+
+"""
+Nearest neighbour index for roadmaps, which grow node by node.
+
+License is based on Creative Commons: Attribution-NonCommercial 4.0 International (CC BY-NC 4.0) (pls. check: http://creativecommons.org/licenses/by-nc/4.0/)
+"""
+
+from scipy.spatial import cKDTree
+import numpy as np
+
+class _Block(object):
+    """ Static cKDTree over a part of the positions. Removed positions stay in the tree until the block is
+    rebuilt, numRemoved counts them"""
+
+    def __init__(self, ids, positions):
+        self.ids = ids
+        self.tree = cKDTree(positions)
+        self.numRemoved = 0
+
+class IncrementalKDTree(object):
+    """ KD-tree index with incremental insertion and removal.
+
+    New positions are collected in a small buffer, which is searched by brute force. A full buffer
+    becomes a static cKDTree block; blocks of equal size are merged like the digits of a binary
+    counter. Every position is rebuilt O(log N) times, so inserting N nodes costs O(N log² N)
+    and a query has to search O(log N) trees instead of all N nodes.
+
+    Removed positions are only marked. A block is rebuilt without them, as soon as they exceed
+    maxRemovedRatio of its positions, so queries never search more than a constant factor of extra
+    positions per block.
+    """
+
+    def __init__(self, bufferSize=32, maxRemovedRatio=0.5):
+        """
+        Args:
+            :bufferSize: number of positions searched by brute force before a tree is built
+            :maxRemovedRatio: fraction of removed positions, at which a block is rebuilt
+        """
+        self.bufferSize = bufferSize
+        self.maxRemovedRatio = maxRemovedRatio
+        self.clear()
+
+    def clear(self):
+        """ Remove all positions"""
+        self._blocks = []  # list of _Block
+        self._bufferIds = []
+        self._bufferPositions = []
+        self._keys = []  # internal id -> key
+        self._positions = []  # internal id -> position
+        self._alive = []  # internal id -> still part of the index?
+        self._blockOf = []  # internal id -> _Block containing it (None while in the buffer)
+        self._idOfKey = dict()
+
+    def __len__(self):
+        return len(self._idOfKey)
+
+    def __contains__(self, key):
+        return key in self._idOfKey
+
+    def insert(self, key, pos):
+        """ Add position pos under the name key (an existing entry of key is replaced)"""
+        if key in self._idOfKey:
+            self.remove(key)
+
+        internalId = len(self._keys)
+        self._keys.append(key)
+        self._positions.append(list(pos))
+        self._alive.append(True)
+        self._blockOf.append(None)
+        self._idOfKey[key] = internalId
+
+        self._bufferIds.append(internalId)
+        self._bufferPositions.append(list(pos))
+        if len(self._bufferIds) >= self.bufferSize:
+            self._flushBuffer()
+
+    def insertMany(self, keys, positions):
+        """ Add positions (array n x dim) under the names keys (new keys only) with one cKDTree build"""
+        positions = np.asarray(positions, dtype=float)
+        first = len(self._keys)
+        ids = np.arange(first, first + len(keys))
+        self._keys.extend(keys)
+        self._positions.extend(positions.tolist())
+        self._alive.extend([True]*len(keys))
+        self._idOfKey.update(zip(keys, ids.tolist()))
+        if len(keys) == 0:
+            return
+
+        # the largest block comes first, the binary counter merging of _flushBuffer only looks at the last ones
+        block = _Block(ids, positions)
+        self._blockOf.extend([block]*len(keys))
+        self._blocks.insert(0, block)
+
+    def remove(self, key):
+        """ Remove the position of key, if it is part of the index"""
+        internalId = self._idOfKey.pop(key, None)
+        if internalId is None:
+            return
+        self._alive[internalId] = False
+
+        # removed positions of the buffer are dropped, when it becomes a block
+        block = self._blockOf[internalId]
+        if block is not None:
+            block.numRemoved += 1
+            if block.numRemoved > self.maxRemovedRatio*len(block.ids):
+                self._compactBlock(block)
+
+    def _compactBlock(self, block):
+        """ Rebuild block with its remaining positions (or drop it, if there are none)"""
+        ids = block.ids[np.array([self._alive[i] for i in block.ids.tolist()], dtype=bool)]
+        if len(ids) == 0:
+            self._blocks.remove(block)
+            return
+        self._blocks[self._blocks.index(block)] = self._newBlock(ids)
+
+    def _newBlock(self, ids):
+        block = _Block(ids, np.array([self._positions[i] for i in ids.tolist()]))
+        for i in ids.tolist():
+            self._blockOf[i] = block
+        return block
+
+    def _flushBuffer(self):
+        ids = list(self._bufferIds)
+
+        # merge all blocks, which are not larger than the new one
+        while self._blocks and len(self._blocks[-1].ids) <= len(ids):
+            ids = self._blocks.pop().ids.tolist() + ids
+
+        # removed positions are dropped while rebuilding
+        ids = [i for i in ids if self._alive[i]]
+        if ids != []:
+            self._blocks.append(self._newBlock(np.array(ids)))
+
+        self._bufferIds = []
+        self._bufferPositions = []
+
+    def queryRadius(self, pos, radius):
+        """ Return list of (distance, key) of all positions within radius around pos, sorted by distance"""
+        pos = np.asarray(pos, dtype=float)
+        candidates = []
+
+        for block in self._blocks:
+            indices = block.tree.query_ball_point(pos, radius)
+            if indices != []:
+                distances = np.linalg.norm(block.tree.data[indices] - pos, axis=1)
+                candidates.extend(zip(distances.tolist(), block.ids[indices].tolist()))
+
+        if self._bufferIds != []:
+            distances = np.linalg.norm(np.array(self._bufferPositions) - pos, axis=1)
+            candidates.extend((distance, internalId) for distance, internalId in zip(distances.tolist(), self._bufferIds) if distance <= radius)
+
+        result = [(distance, self._keys[internalId]) for distance, internalId in candidates if self._alive[internalId]]
+        result.sort(key=lambda element: element[0])
+        return result
+
+    def queryKNearest(self, posArray, k):
+        """ Return for every row of posArray a list of (distance, key) of its k nearest positions, sorted by distance"""
+        posArray = np.atleast_2d(np.asarray(posArray, dtype=float))
+        candidates = [[] for _ in range(len(posArray))]
+
+        for block in self._blocks:
+            # ask for additional neighbours, as some of them may be removed in the meantime
+            kBlock = min(k + block.numRemoved, len(block.ids))
+            distances, indices = block.tree.query(posArray, k=list(range(1, kBlock + 1)))
+            for row in range(len(posArray)):
+                candidates[row].extend(zip(distances[row].tolist(), block.ids[indices[row]].tolist()))
+
+        if self._bufferIds != []:
+            bufferPositions = np.array(self._bufferPositions)
+            distances = np.linalg.norm(bufferPositions[np.newaxis, :, :] - posArray[:, np.newaxis, :], axis=2)
+            for row in range(len(posArray)):
+                candidates[row].extend(zip(distances[row].tolist(), self._bufferIds))
+
+        result = []
+        for rowCandidates in candidates:
+            rowCandidates = [(distance, internalId) for distance, internalId in rowCandidates if self._alive[internalId]]
+            rowCandidates.sort(key=lambda element: element[0])
+            result.append([(distance, self._keys[internalId]) for distance, internalId in rowCandidates[:k]])
+        return result
@@ -7,6 +7,11 @@ License is based on Creative Commons: Attribution-NonCommercial 4.0 Internationa
 """
 
 from HelperPackage.IPPerfMonitor import IPPerfMonitor
+from HelperPackage.IPTourPlanner import planTour
+from HelperPackage.IPSampler import createSampler
+from HelperPackage import IPRoadmapIO
+from HelperPackage.IPRoadmap import pausedGarbageCollection
+from HelperPackage import HelperClass
 
 try:
     from HelperPackage.IPPlanerBase import PlanerBase
@@ -14,20 +19,177 @@ except:
     from HelperPackage.templates.IPPlanerBase import PlanerBase
 
 import random
+import numpy as np
 
 class PRMBase(PlanerBase):
+
+    # loaded roadmaps get the edge attribute weight (length), if the planner searches with it (s. loadRoadmap)
+    _roadmapEdgeWeights = False
     
     def __init__(self,collChecker):
         super(PRMBase,self).__init__(collChecker)
+        self._initInterimTable([])
+        self._roadmapChecker = None
+        self._roadmapSignature = None
+        # seeded from the random module by default, so random.seed() still makes runs reproducible
+        self.randomGenerator = np.random.default_rng(random.getrandbits(64))
+        self.sampler = createSampler("uniform", self._collisionChecker.getDim(), self.randomGenerator)
+        self._clearFreePool()
+
+    def _initSampling(self, config):
+        """ Use a new generator seeded with config["seed"] (optional) and the sampler config["sampler"]
+        (default "uniform", s. IPSampler) for all samples of this call. Otherwise the sampler of the
+        previous call continues its sequence"""
+        samplerName = config.get("sampler", "uniform")
+        if config.get("seed") is not None:
+            self.randomGenerator = np.random.default_rng(config["seed"])
+        elif samplerName == self.sampler.name:
+            return
+        self.sampler = createSampler(samplerName, self._collisionChecker.getDim(), self.randomGenerator)
+        self._clearFreePool()
+
+    def _clearFreePool(self):
+        self._freePool = np.empty((0, self._collisionChecker.getDim()))
+        self._freePoolSignature = None
+        self._freeRate = 0.5  # estimated fraction of free samples, s. _getRandomFreePositions
+
+    def _getRandomPositions(self, n):
+        """ Return the next n positions of the sampler as array (n x dim)"""
+        limits = np.array(self._collisionChecker.getEnvironmentLimits(), dtype=float)
+        return limits[:, 0] + self.sampler.sample(n)*(limits[:, 1] - limits[:, 0])
 
     def _getRandomPosition(self):
-        limits = self._collisionChecker.getEnvironmentLimits()        
-        pos = [random.uniform(limit[0],limit[1]) for limit in limits]
-        return pos
-    
+        return self._getRandomPositions(1)[0].tolist()
+
+    @IPPerfMonitor
+    def _getRandomFreePositions(self, n):
+        """ Return n collision free random positions as array (n x dim).
+
+        Samples are drawn in batches, which are tested with one call of pointsInCollision. The batch size
+        follows the fraction of free samples seen so far, free samples left over are kept in a pool for
+        the next calls (as long as collision checker and scene are unchanged)"""
+        signature = (id(self._collisionChecker), getattr(self._collisionChecker, "sceneVersion", None))
+        if self._freePoolSignature != signature:
+            self._clearFreePool()
+            self._freePoolSignature = signature
+
+        batches = [self._freePool]
+        numFree = len(self._freePool)
+        while numFree < n:
+            batchSize = max(64, int(1.2*(n - numFree)/max(self._freeRate, 0.01)))
+            samples = self._getRandomPositions(batchSize)
+            free = samples[~self._collisionChecker.pointsInCollision(samples)]
+            self._freeRate = 0.5*self._freeRate + 0.5*len(free)/batchSize
+            batches.append(free)
+            numFree += len(free)
+
+        pool = np.concatenate(batches) if len(batches) > 1 else self._freePool
+        self._freePool = pool[n:]
+        return pool[:n]
+
     @IPPerfMonitor
     def _getRandomFreePosition(self):
-        pos = self._getRandomPosition()
-        while self._collisionChecker.pointInCollision(pos):
-            pos = self._getRandomPosition()
-        return pos
+        return self._getRandomFreePositions(1)[0].tolist()
+
+    def _roadmapSignatureOf(self, roadmapParameters):
+        # the roadmap is only valid for the same scene of the collision checker and the same parameters
+        return (getattr(self._collisionChecker, "sceneVersion", None), tuple(roadmapParameters))
+
+    def _canReuseRoadmap(self, config, roadmapParameters):
+        """ Return True, if config["multiQuery"] is set and the roadmap of the previous call was learned
+        with the same collision checker, the same version of its scene and the same roadmap parameters"""
+        return (config.get("multiQuery", False)
+                and self._roadmapChecker is self._collisionChecker
+                and self._roadmapSignature == self._roadmapSignatureOf(roadmapParameters))
+
+    def _rememberRoadmap(self, roadmapParameters):
+        """ Mark the current roadmap as learned for roadmapParameters (s. _canReuseRoadmap)"""
+        self._roadmapChecker = self._collisionChecker
+        self._roadmapSignature = self._roadmapSignatureOf(roadmapParameters)
+
+    def _forgetRoadmap(self):
+        self._roadmapChecker = None
+        self._roadmapSignature = None
+
+    def saveRoadmap(self, path):
+        """ Save the current roadmap (including start and interims of the last query) to the directory path
+        (s. IPRoadmapIO.saveRoadmap). The roadmap parameters are stored as well, so a loaded roadmap is
+        reused by the next call of planRoundPath with config["multiQuery"] and the same parameters"""
+        roadmapParameters = self._roadmapSignature[1] if self._roadmapSignature is not None else None
+        IPRoadmapIO.saveRoadmap(path, self.graph, self._collisionChecker, roadmapParameters)
+
+    def loadRoadmap(self, path):
+        """ Replace the roadmap by the one saved in the directory path. Raises ValueError, if it was learned
+        for a different scene of the collision checker"""
+        roadmap = IPRoadmapIO.loadRoadmap(path, self._collisionChecker)
+        roadmapParameters = roadmap.meta["roadmapParameters"]
+        with pausedGarbageCollection():
+            self.graph = roadmap.toNetworkx(edgeWeights=self._roadmapEdgeWeights)
+            self._restoreRoadmap(roadmapParameters, roadmap)
+
+        if roadmapParameters is None:
+            self._forgetRoadmap()
+        else:
+            self._rememberRoadmap(roadmapParameters)
+
+    def _restoreRoadmap(self, roadmapParameters, roadmap):
+        """ Rebuild the planner specific data structures (kd-tree, components, ...) after self.graph was
+        loaded. roadmapParameters are the ones saved with the roadmap (or None), roadmap is the loaded
+        IPRoadmap.Roadmap (memory-mapped arrays for building the structures in bulk)"""
+        pass
+
+    def _maxNodeNumber(self):
+        # highest integer node name of the roadmap (-1 for none), names of new nodes have to start above
+        return max((node for node in self.graph.nodes() if isinstance(node, int)), default=-1)
+
+    def _terminalNodes(self):
+        """ Return start and interim nodes of the roadmap"""
+        return [node for node in self.graph.nodes() if node == "start" or str(node).startswith("interim")]
+
+    def _getNodeNamebasedOnCoordinates(self,coordinates):
+        
+        # Return the name of the node based on the provided coordinates (O(1) lookup in the position index of the graph)
+        return self.graph.nodeAtPos(coordinates, "")
+
+    def _initInterimTable(self, interimGoalList):
+        """ Precompute the interim table for _nearestInterim: positions as one array and the node names,
+        which are resolved only once. Has to be called after the interims are added to the graph """
+        self._interimPositions = np.array(interimGoalList, dtype=float).reshape(len(interimGoalList), self._collisionChecker.getDim())
+        self._interimNames = [self._getNodeNamebasedOnCoordinates(interim) for interim in interimGoalList]
+        self._interimIndex = dict()
+        for index, interim in enumerate(interimGoalList):
+            self._interimIndex.setdefault(tuple(interim), index)
+
+    def _interimTableIndex(self, interim):
+        # index of an interim in the table, interims not known yet are added
+        index = self._interimIndex.get(tuple(interim))
+        if index is None:
+            index = len(self._interimNames)
+            self._interimIndex[tuple(interim)] = index
+            self._interimNames.append(self._getNodeNamebasedOnCoordinates(interim))
+            self._interimPositions = np.vstack([self._interimPositions, np.array(interim, dtype=float)])
+        return index
+
+    @IPPerfMonitor
+    def _nearestInterim(self,currentNode,checkedInterimGoalList):
+        """ Return [coordinates, distance, name] of the interim of checkedInterimGoalList nearest to currentNode.
+        One vectorized distance computation on the interim table, independent of the size of the roadmap """
+        indices = [self._interimTableIndex(interim) for interim in checkedInterimGoalList]
+        distances = np.linalg.norm(self._interimPositions[indices] - np.asarray(currentNode, dtype=float), axis=1)
+
+        # the first interim wins, if several have the minimal distance
+        minimumIndex = int(np.argmin(distances))
+        return [checkedInterimGoalList[minimumIndex], float(distances[minimumIndex]), self._interimNames[indices[minimumIndex]]]
+
+    @IPPerfMonitor
+    def _planTourPath(self, numInterims, config):
+        """ Plan the roundtrip on the roadmap (self.graph) in the order of the shortest tour from "start"
+        through all interims (config["tourPlanning"]). Returns [] if an interim is not reachable """
+        interimNames = ["interim" + str(i) for i in range(numInterims)]
+        path = planTour(self.graph, "start", interimNames, config.get("tourExactLimit", 10))
+
+        if path == []:
+            HelperClass.HelperClass.printInColor("No Path found!", 'red')
+        else:
+            HelperClass.HelperClass.printInColor("Solution =  " + str(path), 'lawngreen')
+        return path
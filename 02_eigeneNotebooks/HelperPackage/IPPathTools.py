@@ -0,0 +1,66 @@
+# coding: utf-8
+
+"""
+Post-processing of planned paths, shared by the roundtrip planners.
+
+License is based on Creative Commons: Attribution-NonCommercial 4.0 International (CC BY-NC 4.0) (pls. check: http://creativecommons.org/licenses/by-nc/4.0/)
+"""
+
+import numpy as np
+
+def _removeLoopsOfSegment(segment):
+    # last index of every node, the path can jump from the first to the last visit of a node
+    lastIndex = dict()
+    for index, node in enumerate(segment):
+        lastIndex[node] = index
+
+    result = []
+    index = 0
+    while index < len(segment):
+        node = segment[index]
+        result.append(node)
+        index = lastIndex[node] + 1
+    return result
+
+def removeLoops(path, fixed=()):
+    """ Remove all loops of a path (list of node names) in O(len(path)).
+
+    Whenever a node is visited more than once, everything between its first and its last visit is cut
+    out. The first visit of every node in fixed (e.g. start and interim goals) is kept: the path is split
+    there and loops are only removed within the parts in between, so a loop reaching a goal is not
+    removed.
+
+    Args:
+        :path: list of node names
+        :fixed: node names, whose first visit must be part of the result
+
+    Example:
+
+        removeLoops(["start", 1, 2, 3, 2, 4, "interim0", 4, 5], fixed=["start", "interim0"])
+        -> ["start", 1, 2, 4, "interim0", 4, 5]
+    """
+    fixed = set(fixed)
+
+    # split the path at the first visit of every fixed node
+    splitIndices = [0]
+    for index, node in enumerate(path):
+        if node in fixed:
+            fixed.discard(node)
+            if index > 0:
+                splitIndices.append(index)
+    splitIndices.append(len(path) - 1)
+
+    result = []
+    for begin, end in zip(splitIndices[:-1], splitIndices[1:]):
+        segment = _removeLoopsOfSegment(path[begin:end + 1])
+        # the first node of a segment is the last node of the previous one
+        result.extend(segment if result == [] else segment[1:])
+    return result
+
+def pathLength(graph, path):
+    """ Euclidean length of a path (list of node names of graph, whose positions are the node attribute 'pos'),
+    0.0 for paths with less than two nodes"""
+    if len(path) < 2:
+        return 0.0
+    positions = np.array([graph.nodes[node]['pos'] for node in path], dtype=float)
+    return float(np.linalg.norm(np.diff(positions, axis=0), axis=1).sum())
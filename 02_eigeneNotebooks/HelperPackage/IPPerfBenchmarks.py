@@ -0,0 +1,285 @@
+# coding: utf-8
+
+"""
+Micro benchmarks for single building blocks of the planners (collision checking, path post-processing, ...).
+They complement the full planner runs of the PerformanceTest notebook.
+
+License is based on Creative Commons: Attribution-NonCommercial 4.0 International (CC BY-NC 4.0) (pls. check: http://creativecommons.org/licenses/by-nc/4.0/)
+"""
+
+from HelperPackage.IPEnvironment import CollisionChecker
+from HelperPackage.IPPathTools import removeLoops
+from HelperPackage.IPSampler import samplers
+
+from shapely.geometry import Point, LineString
+import numpy as np
+import pandas
+import contextlib
+import copy
+import io
+import signal
+import time
+
+
+def _randomEdges(limits, numEdges, maxEdgeLength, rng):
+    """ Generate random edges inside limits, whose length is at most maxEdgeLength"""
+    lower = np.array([limit[0] for limit in limits], dtype=float)
+    upper = np.array([limit[1] for limit in limits], dtype=float)
+
+    startPoints = rng.uniform(lower, upper, size=(numEdges, len(limits)))
+    directions = rng.normal(size=(numEdges, len(limits)))
+    directions /= np.linalg.norm(directions, axis=1)[:, np.newaxis]
+    lengths = rng.uniform(0.0, maxEdgeLength, size=(numEdges, 1))
+    endPoints = np.clip(startPoints + directions*lengths, lower, upper)
+
+    return startPoints.tolist(), endPoints.tolist()
+
+
+def compareLineCheckModes(benchList, numEdges=2000, maxEdgeLength=5.0, seed=0):
+    """ Compare "sampling" and "exact" lineInCollision on the same random edges of every benchmark.
+
+    Args:
+        :benchList: list of benchmarks (e.g. IPTestSuite.benchList)
+        :numEdges: number of random edges per benchmark
+        :maxEdgeLength: maximal length of the random edges
+        :seed: seed for the edge generation
+
+    Returns a pandas DataFrame with the time per mode and the number of colliding edges.
+    "missedEdges" counts edges reported free by the mode, but colliding in exact mode.
+    """
+    result = []
+
+    for benchmark in benchList:
+        rng = np.random.default_rng(seed)
+        limits = benchmark.collisionChecker.getEnvironmentLimits()
+        startPoints, endPoints = _randomEdges(limits, numEdges, maxEdgeLength, rng)
+
+        collisions = dict()
+        for mode in CollisionChecker.lineCheckModes:
+            collChecker = CollisionChecker(benchmark.collisionChecker.scene, limits, lineCheckMode=mode)
+
+            starttime = time.perf_counter()
+            collisions[mode] = [collChecker.lineInCollision(p1, p2) for p1, p2 in zip(startPoints, endPoints)]
+            endtime = time.perf_counter()
+
+            result.append({"benchmark": benchmark.name,
+                           "mode": mode,
+                           "edges": numEdges,
+                           "time": endtime - starttime,
+                           "timePerEdge": (endtime - starttime)/numEdges,
+                           "collidingEdges": sum(collisions[mode])})
+
+        for element in result[-len(CollisionChecker.lineCheckModes):]:
+            missed = [exact and not other for exact, other in zip(collisions["exact"], collisions[element["mode"]])]
+            element["missedEdges"] = sum(missed)
+
+    return pandas.DataFrame.from_dict(result)
+
+
+def _randomSegmentScene(numObstacles, limits, rng):
+    """ Scene of short buffered segments, similar to the "Spirals" benchmark"""
+    scene = dict()
+    startPoints, endPoints = _randomEdges(limits, numObstacles, 2.0, rng)
+    for i, (p1, p2) in enumerate(zip(startPoints, endPoints)):
+        scene["obs" + str(i)] = LineString([p1, p2]).buffer(0.1)
+    return scene
+
+
+def _linearPointInCollision(scene, pos):
+    """ Reference: test the point against every obstacle of the scene"""
+    for key, value in scene.items():
+        if value.intersects(Point(pos[0], pos[1])):
+            return True
+    return False
+
+
+def compareSceneIndices(obstacleCounts=(10, 100, 1000), numQueries=2000, seed=0):
+    """ Compare setup and query time of the scene indices for a growing number of obstacles.
+
+    "linear" is the reference without index, testing every obstacle for every query.
+
+    Returns a pandas DataFrame with setup time and time per point/segment query.
+    """
+    result = []
+    limits = [[0.0, 22.0], [0.0, 22.0]]
+
+    for numObstacles in obstacleCounts:
+        rng = np.random.default_rng(seed)
+        scene = _randomSegmentScene(numObstacles, limits, rng)
+        queryPoints = rng.uniform(0.0, 22.0, size=(numQueries, 2)).tolist()
+        startPoints, endPoints = _randomEdges(limits, numQueries, 5.0, rng)
+
+        starttime = time.perf_counter()
+        for pos in queryPoints:
+            _linearPointInCollision(scene, pos)
+        endtime = time.perf_counter()
+        result.append({"obstacles": numObstacles,
+                       "index": "linear",
+                       "setupTime": 0.0,
+                       "timePerPoint": (endtime - starttime)/numQueries,
+                       "timePerSegment": np.nan})
+
+        for sceneIndex in CollisionChecker.sceneIndices:
+            starttime = time.perf_counter()
+            collChecker = CollisionChecker(scene, limits, lineCheckMode="exact", sceneIndex=sceneIndex)
+            setupTime = time.perf_counter() - starttime
+
+            starttime = time.perf_counter()
+            for pos in queryPoints:
+                collChecker.pointInCollision(pos)
+            pointTime = time.perf_counter() - starttime
+
+            starttime = time.perf_counter()
+            for p1, p2 in zip(startPoints, endPoints):
+                collChecker.lineInCollision(p1, p2)
+            segmentTime = time.perf_counter() - starttime
+
+            result.append({"obstacles": numObstacles,
+                           "index": sceneIndex,
+                           "setupTime": setupTime,
+                           "timePerPoint": pointTime/numQueries,
+                           "timePerSegment": segmentTime/numQueries})
+
+    return pandas.DataFrame.from_dict(result)
+
+
+def _randomWalkPath(pathLength, numNodes, rng):
+    """ Synthetic path: random walk on a ring of numNodes nodes, which revisits nodes very often"""
+    return (np.cumsum(rng.choice([-1, 1], size=pathLength)) % numNodes).tolist()
+
+
+def _quadraticRemoveLoops(path):
+    """ Reference: former loop removal of LazyPRM. Collect all duplicates with a nested loop (O(n²)),
+    cut out the first one and start again, until there is no duplicate left"""
+    while True:
+        duplicate = []
+        for i in range(len(path)):
+            for j in range(i + 1, len(path)):
+                if path[i] == path[j] and path[i] not in duplicate:
+                    duplicate.append(path[i])
+        if duplicate == []:
+            return path
+        indexList = [index for index, element in enumerate(path) if element == duplicate[0]]
+        path = path[:indexList[0] + 1] + path[indexList[-1] + 1:]
+
+
+def compareLoopRemoval(pathLengths=(100, 1000, 10000), numNodes=200, maxQuadraticLength=2000, seed=0):
+    """ Compare removeLoops with the former quadratic loop removal on synthetic random walk paths.
+
+    Args:
+        :pathLengths: number of steps of the synthetic paths
+        :numNodes: number of different nodes visited by the random walk
+        :maxQuadraticLength: the reference is skipped for longer paths (its run time grows up to cubic)
+        :seed: seed for the path generation
+
+    Returns a pandas DataFrame with the time per method and the length of the resulting path.
+    """
+    result = []
+
+    for pathLength in pathLengths:
+        rng = np.random.default_rng(seed)
+        path = _randomWalkPath(pathLength, numNodes, rng)
+
+        methods = [("removeLoops", removeLoops)]
+        if pathLength <= maxQuadraticLength:
+            methods.append(("quadratic", _quadraticRemoveLoops))
+
+        for name, method in methods:
+            starttime = time.perf_counter()
+            shortPath = method(list(path))
+            endtime = time.perf_counter()
+
+            result.append({"pathLength": pathLength,
+                           "method": name,
+                           "time": endtime - starttime,
+                           "resultLength": len(shortPath)})
+
+    return pandas.DataFrame.from_dict(result)
+
+
+class RunTimeout(BaseException):
+    # BaseException, so it is not caught by the "except Exception" of the planners
+    pass
+
+@contextlib.contextmanager
+def timeLimit(seconds):
+    """ Abort the block with RunTimeout after seconds (only on Unix in the main thread, otherwise no limit)"""
+    if seconds is None or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+
+    def handler(signum, frame):
+        raise RunTimeout()
+
+    previous = signal.signal(signal.SIGALRM, handler)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def compareSamplers(benchList, samplerNames=tuple(samplers), nodeCounts=(25, 50, 100, 200, 400, 800),
+                    radius=3.0, numSeeds=10, plannerClass=None, runTimeout=10.0):
+    """ Nodes-to-success of the samplers: for every benchmark, sampler and seed, the smallest number of roadmap
+    nodes of nodeCounts, with which the planner (default BasicPRM) solves the roundtrip.
+
+    Args:
+        :benchList: list of benchmarks (e.g. IPTestSuite.benchList)
+        :samplerNames: samplers to compare (s. IPSampler.samplers)
+        :nodeCounts: increasing numbers of nodes to try
+        :radius: config["radius"] of the planner
+        :numSeeds: number of runs (config["seed"] = 0, 1, ...) per benchmark and sampler
+        :plannerClass: planner with config keys radius, numNodes and useKDTree
+        :runTimeout: seconds per planner run, a run exceeding it counts as failed (the greedy path search
+                     of the planners can loop for some roadmaps)
+
+    Returns a pandas DataFrame with one row per benchmark and sampler: median and mean of the nodes to
+    success (over the solved runs), number of solved runs, number of timeouts and the total planning time.
+    """
+    if plannerClass is None:
+        from BasicPRM.IPBasicPRM_Roundtrip import BasicPRM as plannerClass
+
+    result = []
+
+    for benchmark in benchList:
+        for samplerName in samplerNames:
+            nodesToSuccess = []
+            timeouts = 0
+            starttime = time.perf_counter()
+
+            for seed in range(numSeeds):
+                for numNodes in nodeCounts:
+                    planner = plannerClass(benchmark.collisionChecker)
+                    config = {"radius": radius, "numNodes": numNodes, "useKDTree": True, "seed": seed, "sampler": samplerName}
+                    try:
+                        with timeLimit(runTimeout), contextlib.redirect_stdout(io.StringIO()):
+                            solution = planner.planRoundPath(copy.deepcopy(benchmark.startList), copy.deepcopy(benchmark.interimGoalList), config)
+                    except RunTimeout:
+                        timeouts += 1
+                        solution = []
+                    if solution != []:
+                        nodesToSuccess.append(numNodes)
+                        break
+
+            endtime = time.perf_counter()
+            result.append({"benchmark": benchmark.name,
+                           "sampler": samplerName,
+                           "medianNodes": np.median(nodesToSuccess) if nodesToSuccess else np.nan,
+                           "meanNodes": np.mean(nodesToSuccess) if nodesToSuccess else np.nan,
+                           "solved": len(nodesToSuccess),
+                           "runs": numSeeds,
+                           "timeouts": timeouts,
+                           "time": endtime - starttime})
+
+    return pandas.DataFrame.from_dict(result)
+
+
+if __name__ == "__main__":
+    from HelperPackage import IPTestSuite
+
+    print(compareLineCheckModes(IPTestSuite.benchList).to_string())
+    print(compareSceneIndices().to_string())
+    print(compareLoopRemoval().to_string())
+    print(compareSamplers(IPTestSuite.benchList).to_string())
@@ -8,27 +8,292 @@ License is based on Creative Commons: Attribution-NonCommercial 4.0 Internationa
 
 
 import pandas
+import contextlib
+import contextvars
+import threading
+import random
+import json
 import time
 
+# return values of other types are aggregated under this key (only bool and None are kept)
+OTHER_RETVAL = "<other>"
+
+# calls outside of any IPPerfMonitor.run are recorded in this run
+DEFAULT_RUN = "<default>"
+
+# durations up to 2^63 ns fit into the histogram
+_NUM_BUCKETS = 512
+_NO_CALL = 1 << 63
+
+def _bucket(ns):
+    """ Bucket of a duration in the streaming histogram: exact below 16ns, above 8 buckets per power of 2
+    (relative resolution about 6%)"""
+    if ns < 16:
+        return ns
+    shift = ns.bit_length() - 4
+    return shift*8 + (ns >> shift)
+
+def _bucketValue(bucket):
+    """ Representative duration (ns) of a bucket: the center of its range"""
+    if bucket < 16:
+        return float(bucket)
+    shift = bucket//8 - 1
+    lower = (8 + bucket % 8) << shift
+    return lower + (1 << shift)/2.0
+
+class _CallNode(object):
+    """ Node of the call tree: one function called on one call path (root -> ... -> name)"""
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.children = dict()  # name -> _CallNode
+        self.calls = 0
+        self.inclusiveNs = 0
+        self.childrenNs = 0  # time spent in monitored children
+
+    def child(self, name):
+        node = self.children.get(name)
+        if node is None:
+            node = self.children[name] = _CallNode(name, self)
+        return node
+
+    @property
+    def exclusiveNs(self):
+        return self.inclusiveNs - self.childrenNs
+
+    def walk(self, path=()):
+        """ Yield (path, node) for all nodes below this one (depth first)"""
+        for name, node in self.children.items():
+            nodePath = path + (name,)
+            yield nodePath, node
+            for result in node.walk(nodePath):
+                yield result
+
+class _FunctionStats(object):
+    """ Aggregated calls of one monitored function (of one instance) in one run"""
+
+    def __init__(self):
+        self.minNs = _NO_CALL
+        self.maxNs = 0
+        self.histogram = [0]*_NUM_BUCKETS  # bucket -> number of calls, s. _bucket
+        self.retVals = dict()  # return value (key) -> [number of calls, total ns]
+        self.data = []  # captured calls, s. IPPerfMonitor.setCaptureRate
+
+    @property
+    def calls(self):
+        return sum(retStats[0] for retStats in self.retVals.values())
+
+    @property
+    def totalNs(self):
+        return sum(retStats[1] for retStats in self.retVals.values())
+
+    def record(self, duration, ret, args, kwargs):
+        # aggregation is kept as short as possible, it runs for every call (s. _bucket)
+        if duration < self.minNs:
+            self.minNs = duration
+        if duration > self.maxNs:
+            self.maxNs = duration
+        if duration < 16:
+            self.histogram[duration] += 1
+        else:
+            shift = duration.bit_length() - 4
+            self.histogram[shift*8 + (duration >> shift)] += 1
+
+        retKey = ret if ret is None or ret is True or ret is False else OTHER_RETVAL
+        retStats = self.retVals.get(retKey)
+        if retStats is None:
+            retStats = self.retVals[retKey] = [0, 0]
+        retStats[0] += 1
+        retStats[1] += duration
+
+        rate = IPPerfMonitor.captureRate
+        if rate > 0.0 and (rate >= 1.0 or IPPerfMonitor._captureRandom.random() < rate):
+            self.data.append({'args': args, 'kwargs': kwargs, "retVal": ret, "time": duration*1e-9})
+
+    def merge(self, other):
+        """ Add the calls of other (e.g. of another instance) to these stats"""
+        self.minNs = min(self.minNs, other.minNs)
+        self.maxNs = max(self.maxNs, other.maxNs)
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+        for retKey, (calls, totalNs) in list(other.retVals.items()):
+            retStats = self.retVals.setdefault(retKey, [0, 0])
+            retStats[0] += calls
+            retStats[1] += totalNs
+        self.data.extend(other.data)
+
+    def percentile(self, q):
+        """ Approximate q-th percentile (0..100) of the call durations in seconds (None without calls)"""
+        calls = self.calls
+        if calls == 0:
+            return None
+        rank = q/100.0*calls
+        count = 0
+        for bucket, bucketCalls in enumerate(self.histogram):
+            count += bucketCalls
+            if bucketCalls > 0 and count >= rank:
+                value = min(max(_bucketValue(bucket), self.minNs), self.maxNs)
+                return value*1e-9
+        return self.maxNs*1e-9
+
+class _Run(object):
+    """ Scope of measurements (s. IPPerfMonitor.run): stats per monitored function and instance, the call
+    tree and the trace events"""
+
+    def __init__(self, runId, tags):
+        self.runId = runId
+        self.tags = dict(tags)
+        self.clear()
+
+    def clear(self):
+        # bound wrappers notice the new stats dict and look up their stats again (s. _BoundMonitor)
+        self.stats = dict()  # (monitor, instance name) -> _FunctionStats
+        self.callTree = _CallNode("<root>")
+        self.traceEvents = []  # (qualified name, start ns, duration ns, thread id)
+        self._threadLocal = threading.local()
+
+    def statsOf(self, stats, monitor, instanceName):
+        """ Return the entry of monitor and instanceName in stats (a stats dict of this run), created if missing"""
+        key = (monitor, instanceName)
+        functionStats = stats.get(key)
+        if functionStats is None:
+            # setdefault is atomic, concurrent threads get the same entry
+            functionStats = stats.setdefault(key, _FunctionStats())
+        return functionStats
+
+    def callStack(self):
+        # every thread has its own call stack within a run
+        stack = getattr(self._threadLocal, "stack", None)
+        if stack is None:
+            stack = self._threadLocal.stack = [self.callTree]
+        return stack
+
+    def row(self, name, instanceName, columns):
+        """ Row of a DataFrame: name, run id, instance (if not None), the tags of the run and columns"""
+        row = {"name": name, "run": self.runId}
+        if instanceName is not None:
+            row["instance"] = instanceName
+        for tag, value in self.tags.items():
+            row.setdefault(tag, value)
+        row.update(columns)
+        return row
+
+_currentRun = contextvars.ContextVar("IPPerfMonitorRun")
+
+def _classAttribute(cls, name):
+    # attribute name as found in the class hierarchy (without calling descriptors)
+    for klass in cls.__mro__:
+        if name in klass.__dict__:
+            return klass.__dict__[name]
+    return None
+
+class _BoundMonitor(object):
+    """ Monitored method bound to an instance. Created once per instance and method and cached in the
+    __dict__ of the instance, so calls via the instance neither create a new object nor call __get__"""
+
+    def __init__(self, monitor, instance):
+        self.__func__ = monitor
+        self.__self__ = instance
+        self.__name__ = monitor.name
+        self.instanceName = type(instance).__name__ + "@" + format(id(instance), "x")
+        self._cached = (None, None)  # (stats dict of a run, stats of this instance in it)
+
+    def __call__(self, *args, **kwargs):
+        run = _currentRun.get(IPPerfMonitor._defaultRun)
+        cached = self._cached
+        if cached[0] is not run.stats:
+            # one tuple, so concurrent threads in different runs never see stats of the wrong run
+            stats = run.stats
+            cached = self._cached = (stats, run.statsOf(stats, self.__func__, self.instanceName))
+        return self.__func__._call(run, cached[1], (self.__self__,) + args, kwargs)
+
+    def __reduce__(self):
+        # copies (copy.deepcopy) and pickles of the instance get wrappers bound to the new instance
+        return (getattr, (self.__self__, self.__name__))
+
 class IPPerfMonitor(object):
-    "Decorator that keeps track of the number of times a function is called."
+    """ Decorator that keeps track of the number of times a function is called and of its run time.
+
+    Every call is aggregated: number of calls, total/min/max time, a streaming histogram of the durations
+    (for percentiles) and calls/time per return value (bool and None, all others as OTHER_RETVAL).
+    The memory needed does not grow with the number of calls.
+
+    Calls are recorded per run and per instance of the monitored method (e.g. planner instance). A run is
+    entered with
+
+        with IPPerfMonitor.run("lazyPRM/Trap", planner="lazyPRM", benchmark="Trap"):
+            planner.planRoundPath(...)
+
+    and is scoped by contextvars, so runs in different threads are recorded separately and no clearData()
+    is needed between them. Calls outside of any run are recorded in the run DEFAULT_RUN. The results
+    (dataFrame, summary, callTree, ...) contain the columns run, instance and the tags of the run and can be
+    restricted to one run id.
+
+    Full records of single calls (args, kwargs, retVal, time) are only kept if enabled by
+    IPPerfMonitor.setCaptureRate(rate): a random fraction rate of all calls is recorded, rate 1.0 records
+    every call (as former versions did).
+
+    IPPerfMonitor.setTracing(True) additionally tracks the stack of monitored calls: inclusive and exclusive
+    time per call path (callTree(), collapsedStacks()) and optionally every call as event (chromeTrace()).
+    Call paths use the qualified names (e.g. LazyPRM.planRoundPath), so equally named methods of different
+    planners are kept apart.
+    """
 
-    __instances = {}
+    captureRate = 0.0
+    _captureRandom = random.Random(0)
+
+    _tracing = False
+    _recordEvents = False
+    _maxTraceEvents = 0
+
+    _defaultRun = _Run(DEFAULT_RUN, {})
+    _runs = {DEFAULT_RUN: _defaultRun}  # run id -> _Run
+    _runsLock = threading.Lock()
 
     def __init__(self, f):
 
         self.__f = f
-        self.data = []
-        IPPerfMonitor.__instances[f] = self
+        self.name = f.__name__
+        self.qualname = f.__qualname__
 
     def __call__(self, *args, **kwargs):
-        
-        starttime = time.time()
+        # plain functions (and methods called via the class) are recorded without instance
+        run = _currentRun.get(IPPerfMonitor._defaultRun)
+        return self._call(run, run.statsOf(run.stats, self, ""), args, kwargs)
+
+    def _call(self, run, stats, args, kwargs):
+
+        if IPPerfMonitor._tracing:
+            return self._tracedCall(run, stats, args, kwargs)
+
+        starttime = time.perf_counter_ns()
         ret = self.__f(*args, **kwargs)
-        endtime = time.time()
-        element = {'args': args, 'kwargs': kwargs, "retVal": ret, "time": endtime-starttime}
-        self.data.append(element)
-        
+        duration = time.perf_counter_ns() - starttime
+
+        stats.record(duration, ret, args, kwargs)
+        return ret
+
+    def _tracedCall(self, run, stats, args, kwargs):
+        # call as child of the currently running monitored call (of this thread in this run)
+        stack = run.callStack()
+        node = stack[-1].child(self.qualname)
+        stack.append(node)
+
+        starttime = time.perf_counter_ns()
+        try:
+            ret = self.__f(*args, **kwargs)
+        finally:
+            duration = time.perf_counter_ns() - starttime
+            stack.pop()
+            node.calls += 1
+            node.inclusiveNs += duration
+            node.parent.childrenNs += duration
+
+            events = run.traceEvents
+            if IPPerfMonitor._recordEvents and len(events) < IPPerfMonitor._maxTraceEvents:
+                events.append((self.qualname, starttime, duration, threading.get_ident()))
+
+        stats.record(duration, ret, args, kwargs)
         return ret
 
     def _showargs(self, *fargs, **kw):
@@ -36,26 +301,182 @@ class IPPerfMonitor(object):
 
 
     def __get__(self, instance, owner):
-        from functools import partial
-        return partial(self.__call__, instance)
+        if instance is None:
+            return self
+        bound = _BoundMonitor(self, instance)
+        # following accesses find the wrapper in the instance. Not cached for super() calls, there the
+        # attribute of the instance is the method of a subclass
+        instanceDict = getattr(instance, "__dict__", None)
+        if instanceDict is not None and _classAttribute(type(instance), self.name) is self:
+            instanceDict[self.name] = bound
+        return bound
+
+    @staticmethod
+    @contextlib.contextmanager
+    def run(runId, **tags):
+        """ Record all monitored calls of the with block into the run runId, the tags (e.g. planner, benchmark)
+        become columns of the results. Entering an existing run id continues that run.
+
+        The run is bound to the current context (thread, asyncio task): it has to be entered in the thread
+        that calls the planner, e.g. in the function submitted to a ThreadPoolExecutor."""
+        with IPPerfMonitor._runsLock:
+            run = IPPerfMonitor._runs.get(runId)
+            if run is None:
+                run = IPPerfMonitor._runs[runId] = _Run(runId, tags)
+            else:
+                run.tags.update(tags)
+        token = _currentRun.set(run)
+        try:
+            yield run
+        finally:
+            _currentRun.reset(token)
+
+    @staticmethod
+    def _selectRuns(runId):
+        # all runs for runId None
+        with IPPerfMonitor._runsLock:
+            if runId is None:
+                return list(IPPerfMonitor._runs.values())
+            run = IPPerfMonitor._runs.get(runId)
+            return [run] if run is not None else []
+
+    @staticmethod
+    def setCaptureRate(rate, seed=0):
+        """ Record the arguments and return value of a random fraction rate (0..1) of all calls in data
+        (0.0: aggregate only, default; 1.0: every call). Captured records keep their arguments alive!"""
+        IPPerfMonitor.captureRate = rate
+        IPPerfMonitor._captureRandom = random.Random(seed)
+
+    @staticmethod
+    def dataFrame(runId=None):
+        """ Return a DataFrame of the calls of all registered functions (in all runs or the run runId).
+
+        With capture rate 1.0 there is one row per call (name, run, instance, tags, args, kwargs, retVal, time).
+        Otherwise there is one row per function, run, instance and return value (name, run, instance, tags,
+        retVal, calls, time), time is the total time in seconds, so e.g. groupby("name").sum()["time"] is the
+        same in both cases.
+        """
+        if IPPerfMonitor.captureRate >= 1.0:
+            return IPPerfMonitor.capturedDataFrame(runId)
+
+        result = []
+        for run in IPPerfMonitor._selectRuns(runId):
+            for (monitor, instanceName), stats in list(run.stats.items()):
+                for retVal, (calls, totalNs) in list(stats.retVals.items()):
+                    result.append(run.row(monitor.name, instanceName, {"retVal": retVal, "calls": calls, "time": totalNs*1e-9}))
+        return pandas.DataFrame.from_dict(result)
 
     @staticmethod
-    def dataFrame():
-        "Return a dict of {function: # of calls} for all registered functions."
+    def capturedDataFrame(runId=None):
+        "Return a DataFrame of all captured calls (s. setCaptureRate), one row per call."
         result = []
-        for f in IPPerfMonitor.__instances:
-            
-            for dataElement in IPPerfMonitor.__instances[f].data:
-                context = dict({"name": f.__name__})
-                context.update(dataElement)
-                result.append(context)
+        for run in IPPerfMonitor._selectRuns(runId):
+            for (monitor, instanceName), stats in list(run.stats.items()):
+
+                for dataElement in list(stats.data):
+                    result.append(run.row(monitor.name, instanceName, dataElement))
         return pandas.DataFrame.from_dict(result)
 
     @staticmethod
-    def clearData():
-       "Clear data"
-       for f in IPPerfMonitor.__instances:
-            del IPPerfMonitor.__instances[f].data[:]
+    def summary(runId=None, byInstance=False):
+        """ Return a DataFrame with one row per called function and run (and instance, if byInstance):
+        calls, total/mean/min/max time and percentiles (seconds)."""
+        groups = dict()  # (monitor, run, instance name) -> merged _FunctionStats
+        for run in IPPerfMonitor._selectRuns(runId):
+            for (monitor, instanceName), stats in list(run.stats.items()):
+                key = (monitor, run, instanceName if byInstance else None)
+                if key not in groups:
+                    groups[key] = _FunctionStats()
+                groups[key].merge(stats)
 
-    
+        result = []
+        for (monitor, run, instanceName), stats in groups.items():
+            calls = stats.calls
+            if calls == 0:
+                continue
+            result.append(run.row(monitor.name, instanceName,
+                                  {"calls": calls,
+                                   "time": stats.totalNs*1e-9,
+                                   "mean": stats.totalNs*1e-9/calls,
+                                   "min": stats.minNs*1e-9,
+                                   "p50": stats.percentile(50),
+                                   "p90": stats.percentile(90),
+                                   "p99": stats.percentile(99),
+                                   "max": stats.maxNs*1e-9}))
+        return pandas.DataFrame.from_dict(result)
+
+    @staticmethod
+    def setTracing(enabled, traceEvents=False, maxTraceEvents=1000000):
+        """ Track the call stack of the monitored functions (s. callTree). With traceEvents every call is
+        recorded as event for chromeTrace (at most maxTraceEvents per run, they need memory)"""
+        IPPerfMonitor._tracing = enabled
+        IPPerfMonitor._recordEvents = traceEvents
+        IPPerfMonitor._maxTraceEvents = maxTraceEvents
+
+    @staticmethod
+    def callTree(runId=None):
+        """ Return the call tree as DataFrame, one row per run and call path (depth first, children in call
+        order): run, path (names joined by ";"), name, depth, parent (path), calls, inclusive and exclusive
+        time (seconds) and the share of the inclusive time of the parent"""
+        result = []
+        for run in IPPerfMonitor._selectRuns(runId):
+            for path, node in run.callTree.walk():
+                parentNs = node.parent.inclusiveNs
+                result.append({"run": run.runId,
+                               "path": ";".join(path),
+                               "name": node.name,
+                               "depth": len(path) - 1,
+                               "parent": ";".join(path[:-1]),
+                               "calls": node.calls,
+                               "inclusive": node.inclusiveNs*1e-9,
+                               "exclusive": node.exclusiveNs*1e-9,
+                               "shareOfParent": node.inclusiveNs/parentNs if node.parent.parent is not None and parentNs > 0 else 1.0})
+        return pandas.DataFrame.from_dict(result, orient="columns")
+
+    @staticmethod
+    def collapsedStacks(fileName=None, runId=None):
+        """ Return the call tree in the collapsed stack format of flamegraph tools (flamegraph.pl, speedscope):
+        one line "name1;name2;name3 <exclusive time in microseconds>" per call path, the run id is the first
+        name (except for DEFAULT_RUN). Written to fileName, if given"""
+        lines = []
+        for run in IPPerfMonitor._selectRuns(runId):
+            prefix = () if run.runId == DEFAULT_RUN else (str(run.runId),)
+            for path, node in run.callTree.walk():
+                exclusiveUs = node.exclusiveNs//1000
+                if exclusiveUs > 0:
+                    lines.append(";".join(prefix + path) + " " + str(exclusiveUs))
+        text = "\n".join(lines) + "\n"
+        if fileName is not None:
+            with open(fileName, "w") as stackFile:
+                stackFile.write(text)
+        return text
+
+    @staticmethod
+    def chromeTrace(fileName=None, runId=None):
+        """ Return the recorded call events (s. setTracing) in the Chrome trace event format (chrome://tracing,
+        Perfetto) as dict, every run is shown as process. Written as json to fileName, if given"""
+        runs = IPPerfMonitor._selectRuns(runId)
+        startNs = min((event[1] for run in runs for event in run.traceEvents), default=0)
+        threadIds = dict()
+        traceEvents = []
+        for processId, run in enumerate(runs):
+            events = list(run.traceEvents)
+            if not events:
+                continue
+            traceEvents.append({"name": "process_name", "ph": "M", "pid": processId, "args": {"name": str(run.runId)}})
+            for name, start, duration, threadId in events:
+                traceEvents.append({"name": name, "cat": "IPPerfMonitor", "ph": "X", "pid": processId,
+                                    "tid": threadIds.setdefault(threadId, len(threadIds)),
+                                    "ts": (start - startNs)/1000.0, "dur": duration/1000.0})
+        trace = {"traceEvents": traceEvents, "displayTimeUnit": "ms"}
+        if fileName is not None:
+            with open(fileName, "w") as traceFile:
+                json.dump(trace, traceFile)
+        return trace
+
+    @staticmethod
+    def clearData(runId=None):
+       "Clear data (of all runs or of the run runId)"
+       for run in IPPerfMonitor._selectRuns(runId):
+            run.clear()
 
@@ -0,0 +1,404 @@
+# coding: utf-8
+
+"""
+Compact, array-backed roadmap for large numbers of nodes (10^5 - 10^6): positions in one NumPy array,
+nodes identified by int ids, adjacency as int32 CSR. Graph searches run directly on the arrays, a
+networkx graph (e.g. for the IPVIS visualizers) is only created on demand.
+
+License is based on Creative Commons: Attribution-NonCommercial 4.0 International (CC BY-NC 4.0) (pls. check: http://creativecommons.org/licenses/by-nc/4.0/)
+"""
+
+from HelperPackage.IPIndexedGraph import PositionIndexedGraph
+
+from scipy.sparse import csr_matrix
+from scipy.sparse import csgraph
+import numpy as np
+import contextlib
+import gc
+import heapq
+import math
+
+@contextlib.contextmanager
+def pausedGarbageCollection():
+    """ Pause the garbage collector while large graphs are built, it would scan the growing containers
+    again and again (seconds for 10^5 nodes)"""
+    gcEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gcEnabled:
+            gc.enable()
+
+def _codeTable(values):
+    # encode a list of strings as int8 codes and the table of the used strings ("" is code 0)
+    table = [""] + sorted(set(values) - {""})
+    codeOf = {value: code for code, value in enumerate(table)}
+    return np.array([codeOf[value] for value in values], dtype=np.int8), table
+
+class Roadmap(object):
+    """ Undirected roadmap with int node ids 0..n-1.
+
+    Node i is at positions[i], its neighbours are indices[indptr[i]:indptr[i+1]] (every edge is stored
+    in both directions), the edge length is the Euclidean distance of both nodes. The attributes of the
+    networkx roadmaps are kept compactly: color and nodeType as int8 codes into colorTable/typeTable,
+    the node name as int in nodeIds or, for all other names (start, interims), as string in names.
+
+    Nodes and edges can be added one by one (amortized O(1)), the CSR arrays are rebuilt on the next
+    query. Memory: about 30 bytes per node plus 8 bytes per edge in 2D (a networkx node with its
+    attribute dict takes several hundred bytes).
+
+    Example:
+
+        roadmap = Roadmap(2)
+        a = roadmap.addNode([1, 1], name="start")
+        b = roadmap.addNode([5, 1])
+        roadmap.addEdge(a, b)
+        roadmap.astar(a, b) -> (4.0, [0, 1])
+    """
+
+    def __init__(self, dim):
+        self.dim = dim
+        self._numNodes = 0
+        self._positions = np.empty((0, dim))
+        self._nodeIds = np.empty(0, dtype=np.int64)
+        self._colors = np.empty(0, dtype=np.int8)
+        self._nodeTypes = np.empty(0, dtype=np.int8)
+        self.colorTable = [""]
+        self.typeTable = [""]
+        self.names = dict()  # id -> name, for all nodes which are not named by an int
+        self.meta = dict()  # free meta data, e.g. the roadmap parameters of a loaded roadmap
+        self._indexOfName = None
+        self._indptr = np.zeros(1, dtype=np.int32)
+        self._indices = np.empty(0, dtype=np.int32)
+        self._pendingEdges = []
+        self._edgeLengths = None
+
+    # construction
+
+    @classmethod
+    def fromArrays(cls, positions, indptr, indices, nodeIds=None, colors=None, nodeTypes=None,
+                   colorTable=None, typeTable=None, names=None):
+        """ Create a roadmap from existing arrays (symmetric CSR), which are used without copy (e.g.
+        memory-mapped arrays of a saved roadmap). nodeIds defaults to the index of the node"""
+        numNodes, dim = positions.shape
+        roadmap = cls(dim)
+        roadmap._numNodes = numNodes
+        roadmap._positions = positions
+        roadmap._indptr = indptr
+        roadmap._indices = indices
+        roadmap._nodeIds = nodeIds if nodeIds is not None else np.arange(numNodes, dtype=np.int64)
+        roadmap._colors = colors if colors is not None else np.zeros(numNodes, dtype=np.int8)
+        roadmap._nodeTypes = nodeTypes if nodeTypes is not None else np.zeros(numNodes, dtype=np.int8)
+        roadmap.colorTable = list(colorTable) if colorTable is not None else [""]
+        roadmap.typeTable = list(typeTable) if typeTable is not None else [""]
+        roadmap.names = dict(names) if names is not None else dict()
+        return roadmap
+
+    @classmethod
+    def fromNetworkx(cls, graph, dim=None):
+        """ Create a roadmap from a networkx graph with the node attribute 'pos' (and optional 'color' and
+        'nodeType'). The ids follow the node order of the graph"""
+        nodes = list(graph.nodes())
+        indexOf = {node: index for index, node in enumerate(nodes)}
+        positions = np.array([graph.nodes[node]['pos'] for node in nodes], dtype=float)
+        if dim is None:
+            dim = positions.shape[1] if len(nodes) > 0 else 2
+        positions = positions.reshape(len(nodes), dim)
+
+        edges = np.array([(indexOf[node1], indexOf[node2]) for node1, node2 in graph.edges()], dtype=np.int64).reshape(-1, 2)
+        indptr, indices = cls._buildCSR(len(nodes), edges)
+
+        # integer names are stored as array, all others as strings
+        isId = [isinstance(node, (int, np.integer)) and not isinstance(node, bool) for node in nodes]
+        nodeIds = np.array([int(node) if nodeIsId else -1 for node, nodeIsId in zip(nodes, isId)], dtype=np.int64)
+        names = {index: node for index, (node, nodeIsId) in enumerate(zip(nodes, isId)) if not nodeIsId}
+
+        colors, colorTable = _codeTable([graph.nodes[node].get("color", "") for node in nodes])
+        nodeTypes, typeTable = _codeTable([graph.nodes[node].get("nodeType", "") for node in nodes])
+        return cls.fromArrays(positions, indptr, indices, nodeIds, colors, nodeTypes, colorTable, typeTable, names)
+
+    @staticmethod
+    def _buildCSR(numNodes, edges):
+        # symmetric int32 CSR from an (m, 2) array of edges, neighbours sorted by id
+        sources = np.concatenate([edges[:, 0], edges[:, 1]])
+        targets = np.concatenate([edges[:, 1], edges[:, 0]])
+        # sorting one int64 key per entry is much faster than lexsort
+        keys = np.sort(sources*numNodes + targets)
+        indices = (keys % max(numNodes, 1)).astype(np.int32)
+        indptr = np.zeros(numNodes + 1, dtype=np.int32)
+        np.cumsum(np.bincount(sources, minlength=numNodes), out=indptr[1:])
+        return indptr, indices
+
+    @staticmethod
+    def _code(table, value):
+        if value not in table:
+            table.append(value)
+        return table.index(value)
+
+    def _grow(self, numNodes):
+        # make room for numNodes nodes (capacity doubles, memory-mapped arrays are copied once)
+        capacity = len(self._positions)
+        if numNodes <= capacity and self._positions.flags.writeable:
+            return
+        capacity = max(numNodes, 2*capacity, 16)
+        for name in ("_positions", "_nodeIds", "_colors", "_nodeTypes"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._numNodes] = old[:self._numNodes]
+            setattr(self, name, new)
+
+    def addNode(self, pos, name=None, color="", nodeType=""):
+        """ Add a node and return its id. name defaults to the id"""
+        nodeId = self._numNodes
+        self._grow(nodeId + 1)
+        self._positions[nodeId] = pos
+        if name is None:
+            name = nodeId
+        if isinstance(name, (int, np.integer)) and not isinstance(name, bool):
+            self._nodeIds[nodeId] = name
+        else:
+            self._nodeIds[nodeId] = -1
+            self.names[nodeId] = name
+        self._colors[nodeId] = self._code(self.colorTable, color)
+        self._nodeTypes[nodeId] = self._code(self.typeTable, nodeType)
+        self._numNodes += 1
+        if self._indexOfName is not None:
+            self._indexOfName[name] = nodeId
+        return nodeId
+
+    def addNodes(self, positions):
+        """ Add several nodes (array of positions) and return their ids"""
+        positions = np.asarray(positions, dtype=float).reshape(-1, self.dim)
+        ids = np.arange(self._numNodes, self._numNodes + len(positions))
+        self._grow(self._numNodes + len(positions))
+        self._positions[ids] = positions
+        self._nodeIds[ids] = ids
+        self._colors[ids] = 0
+        self._nodeTypes[ids] = 0
+        self._numNodes += len(positions)
+        self._indexOfName = None
+        return ids
+
+    def addEdge(self, node1, node2):
+        """ Add the edge between the ids node1 and node2"""
+        self.addEdges([(node1, node2)])
+
+    def addEdges(self, edges):
+        """ Add several edges (pairs of ids)"""
+        self._pendingEdges.append(np.asarray(edges, dtype=np.int64).reshape(-1, 2))
+
+    def _flushEdges(self):
+        # merge the pending edges and the nodes added since the last query into the CSR arrays
+        numOldNodes = len(self._indptr) - 1
+        if not self._pendingEdges:
+            if numOldNodes < self._numNodes:
+                # new nodes without edges
+                self._indptr = np.concatenate([self._indptr, np.full(self._numNodes - numOldNodes, self._indptr[-1], dtype=np.int32)])
+            return
+        edges = np.concatenate([self._csrEdges()] + self._pendingEdges)
+        self._pendingEdges = []
+        # every edge once, lower id first (unique on one int64 key per edge)
+        edges = np.sort(edges, axis=1)
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        keys = np.sort(edges[:, 0]*self._numNodes + edges[:, 1])
+        keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])] if len(keys) > 0 else keys
+        edges = np.stack([keys//self._numNodes, keys % self._numNodes], axis=1)
+        self._indptr, self._indices = self._buildCSR(self._numNodes, edges)
+        self._edgeLengths = None
+
+    # access
+
+    def __len__(self):
+        return self._numNodes
+
+    @property
+    def positions(self):
+        return self._positions[:self._numNodes]
+
+    @property
+    def nodeIds(self):
+        return self._nodeIds[:self._numNodes]
+
+    @property
+    def colors(self):
+        return self._colors[:self._numNodes]
+
+    @property
+    def nodeTypes(self):
+        return self._nodeTypes[:self._numNodes]
+
+    @property
+    def indptr(self):
+        self._flushEdges()
+        return self._indptr
+
+    @property
+    def indices(self):
+        self._flushEdges()
+        return self._indices
+
+    @property
+    def numEdges(self):
+        return len(self.indices)//2
+
+    def edges(self):
+        """ Return (m, 2) array of all edges (lower id first)"""
+        self._flushEdges()
+        return self._csrEdges()
+
+    def _csrEdges(self):
+        sources = np.repeat(np.arange(len(self._indptr) - 1), np.diff(self._indptr))
+        targets = np.asarray(self._indices, dtype=np.int64)
+        mask = sources < targets
+        return np.stack([sources[mask], targets[mask]], axis=1)
+
+    def neighbours(self, node):
+        indptr = self.indptr
+        return self._indices[indptr[node]:indptr[node + 1]]
+
+    def edgeLengths(self):
+        """ Euclidean length of every CSR entry (aligned with indices)"""
+        indptr = self.indptr
+        if self._edgeLengths is None:
+            sources = np.repeat(np.arange(self._numNodes), np.diff(indptr))
+            self._edgeLengths = np.linalg.norm(self.positions[self._indices] - self.positions[sources], axis=1)
+        return self._edgeLengths
+
+    def name(self, node):
+        """ Name of the node with the given id"""
+        return self.names.get(node, int(self._nodeIds[node]))
+
+    def nodeNames(self):
+        """ Names of all nodes as list (index -> name)"""
+        names = np.asarray(self.nodeIds).tolist()
+        for index, name in self.names.items():
+            names[index] = name
+        return names
+
+    def index(self, name):
+        """ Id of the node with the given name (the lookup table is built on first use)"""
+        if self._indexOfName is None:
+            nodeIds = self.nodeIds.tolist()
+            self._indexOfName = {nodeId: index for index, nodeId in enumerate(nodeIds) if index not in self.names}
+            self._indexOfName.update({name: index for index, name in self.names.items()})
+        return self._indexOfName[name]
+
+    def _matrix(self):
+        # sparse matrix of the edge lengths, shares the CSR arrays
+        return csr_matrix((self.edgeLengths(), self._indices, self._indptr), shape=(self._numNodes, self._numNodes))
+
+    # searches, all return paths as lists of ids ([] if there is none)
+
+    @staticmethod
+    def _pathFromPredecessors(predecessors, source, target):
+        if target != source and predecessors[target] < 0:
+            return []
+        path = [target]
+        while path[-1] != source:
+            path.append(int(predecessors[path[-1]]))
+        return path[::-1]
+
+    def bfs(self, source, target):
+        """ Path with the fewest edges from source to target"""
+        _, predecessors = csgraph.breadth_first_order(self._matrix(), source, directed=True, return_predecessors=True)
+        return self._pathFromPredecessors(predecessors, source, target)
+
+    def connectedComponents(self):
+        """ Return (number of components, component label of every node)"""
+        return csgraph.connected_components(self._matrix(), directed=False)
+
+    def dijkstra(self, source, target=None):
+        """ Shortest paths from source (compiled, over all nodes). Returns the array of distances of all
+        nodes, if no target is given, otherwise (length, path) (inf, []) if target is not reachable"""
+        distances, predecessors = csgraph.dijkstra(self._matrix(), directed=True, indices=source, return_predecessors=True)
+        if target is None:
+            return distances
+        return float(distances[target]), self._pathFromPredecessors(predecessors, source, target)
+
+    def astar(self, source, target):
+        """ Shortest path from source to target with the Euclidean distance to target as heuristic, only the
+        nodes in the direction of target are expanded. Returns (length, path), (inf, []) if not reachable"""
+        indptr = self.indptr
+        indices = self._indices
+        lengths = self.edgeLengths()
+
+        # heuristic of all nodes in one vectorized step, cheaper than per expanded node
+        heuristic = np.linalg.norm(self.positions - self.positions[target], axis=1)
+
+        distance = {source: 0.0}
+        predecessor = {source: -1}
+        closed = set()
+        queue = [(float(heuristic[source]), 0.0, source)]
+
+        while queue:
+            _, dist, node = heapq.heappop(queue)
+            if node == target:
+                path = [node]
+                while predecessor[path[-1]] != -1:
+                    path.append(predecessor[path[-1]])
+                return dist, path[::-1]
+            if node in closed:
+                continue
+            closed.add(node)
+
+            begin, end = indptr[node], indptr[node + 1]
+            for neighbour, length in zip(indices[begin:end].tolist(), lengths[begin:end].tolist()):
+                newDist = dist + length
+                if newDist < distance.get(neighbour, math.inf):
+                    distance[neighbour] = newDist
+                    predecessor[neighbour] = node
+                    heapq.heappush(queue, (newDist + heuristic[neighbour], newDist, neighbour))
+
+        return math.inf, []
+
+    # export
+
+    def toNetworkx(self, graphClass=PositionIndexedGraph, edgeWeights=False):
+        """ Create the networkx graph (node names, attributes pos, color and nodeType) as used by the
+        planners and the IPVIS visualizers. With edgeWeights the edges get the attribute weight (length)"""
+        with pausedGarbageCollection():
+            return self._buildNetworkx(graphClass(), edgeWeights)
+
+    def _buildNetworkx(self, graph, edgeWeights):
+        names = self.nodeNames()
+        attributes = [{"pos": pos} for pos in np.asarray(self.positions).tolist()]
+        colors = np.asarray(self.colors)
+        nodeTypes = np.asarray(self.nodeTypes)
+        for index in np.flatnonzero(colors).tolist():
+            attributes[index]["color"] = self.colorTable[colors[index]]
+        for index in np.flatnonzero(nodeTypes).tolist():
+            attributes[index]["nodeType"] = self.typeTable[nodeTypes[index]]
+
+        # names of both ends of all edges, looked up with numpy
+        nameArray = np.empty(len(names), dtype=object)
+        nameArray[:] = names
+        edges = self.edges()
+        sources = nameArray[edges[:, 0]].tolist()
+        targets = nameArray[edges[:, 1]].tolist()
+        if edgeWeights:
+            positions = np.asarray(self.positions)
+            lengths = np.linalg.norm(positions[edges[:, 0]] - positions[edges[:, 1]], axis=1).tolist()
+            edgeAttributes = [{"weight": length} for length in lengths]
+        else:
+            edgeAttributes = [{} for _ in range(len(sources))]
+
+        if graph.is_directed() or graph.is_multigraph():
+            graph.add_nodes_from(zip(names, attributes))
+            graph.add_edges_from(zip(sources, targets, edgeAttributes))
+            return graph
+
+        # fill the dicts of networkx directly (node -> attributes, node -> neighbour -> edge attributes shared
+        # by both directions), add_node/add_edge per element take seconds for 100k nodes
+        graph._node.update(zip(names, attributes))
+        adjacency = graph._adj
+        adjacency.update((name, {}) for name in names)
+        for source, target, edgeData in zip(sources, targets, edgeAttributes):
+            adjacency[source][target] = edgeData
+            adjacency[target][source] = edgeData
+        if isinstance(graph, PositionIndexedGraph):
+            graph.rebuildIndex()
+        return graph
+
+    # networkx style name
+    to_networkx = toNetworkx
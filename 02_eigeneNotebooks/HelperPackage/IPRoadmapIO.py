@@ -0,0 +1,85 @@
+# coding: utf-8
+
+"""
+Save and load roadmaps in a compact binary format: one directory with the NumPy arrays of a Roadmap
+(positions, int32 CSR adjacency, node types and colors) and a small json file with the meta data.
+
+License is based on Creative Commons: Attribution-NonCommercial 4.0 International (CC BY-NC 4.0) (pls. check: http://creativecommons.org/licenses/by-nc/4.0/)
+"""
+
+from HelperPackage.IPRoadmap import Roadmap
+
+import numpy as np
+import hashlib
+import json
+import os
+
+FORMAT_VERSION = 1
+
+_arrayFiles = ("positions", "indptr", "indices", "nodeIds", "nodeTypes", "colors")
+
+def sceneHash(collisionChecker):
+    """ Return a hash (hex string) of the obstacles and the limits of the environment of a collision checker"""
+    digest = hashlib.sha256()
+    scene = collisionChecker.scene
+    for name in sorted(scene, key=str):
+        digest.update(str(name).encode("utf-8"))
+        digest.update(scene[name].wkb)
+    digest.update(repr([[float(value) for value in limit] for limit in collisionChecker.getEnvironmentLimits()]).encode("utf-8"))
+    return digest.hexdigest()
+
+def saveRoadmap(path, roadmap, collisionChecker, roadmapParameters=None):
+    """ Save a roadmap to the directory path.
+
+    Args:
+        :path: directory (created, if it does not exist)
+        :roadmap: Roadmap or networkx graph with the node attribute 'pos'
+        :collisionChecker: collision checker the roadmap was learned with (for the scene hash)
+        :roadmapParameters: optional list of parameters the roadmap was learned with
+    """
+    dim = collisionChecker.getDim()
+    if not isinstance(roadmap, Roadmap):
+        roadmap = Roadmap.fromNetworkx(roadmap, dim)
+
+    os.makedirs(path, exist_ok=True)
+    arrays = {"positions": roadmap.positions, "indptr": roadmap.indptr, "indices": roadmap.indices,
+              "nodeIds": roadmap.nodeIds, "nodeTypes": roadmap.nodeTypes, "colors": roadmap.colors}
+    for name in _arrayFiles:
+        np.save(os.path.join(path, name + ".npy"), arrays[name])
+
+    meta = {"formatVersion": FORMAT_VERSION,
+            "sceneHash": sceneHash(collisionChecker),
+            "dim": dim,
+            "numNodes": len(roadmap),
+            "numEdges": roadmap.numEdges,
+            "names": {str(index): name for index, name in roadmap.names.items()},
+            "typeTable": roadmap.typeTable,
+            "colorTable": roadmap.colorTable,
+            "roadmapParameters": list(roadmapParameters) if roadmapParameters is not None else None}
+    with open(os.path.join(path, "meta.json"), "w") as metaFile:
+        json.dump(meta, metaFile)
+
+def loadRoadmap(path, collisionChecker, mmap=True):
+    """ Load a roadmap saved with saveRoadmap.
+
+    Args:
+        :path: directory of the roadmap
+        :collisionChecker: the roadmap is only loaded, if its scene and limits are the ones it was saved with
+        :mmap: memory-map the arrays instead of reading them (loading is independent of the roadmap size)
+
+    Returns Roadmap (with the meta data in roadmap.meta), raises ValueError if the scene hash does not match
+    """
+    with open(os.path.join(path, "meta.json")) as metaFile:
+        meta = json.load(metaFile)
+
+    if meta.get("formatVersion") != FORMAT_VERSION:
+        raise ValueError("Unknown roadmap format version: " + str(meta.get("formatVersion")))
+    if meta["sceneHash"] != sceneHash(collisionChecker):
+        raise ValueError("Roadmap " + str(path) + " was learned for a different scene")
+
+    arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r" if mmap else None) for name in _arrayFiles}
+    names = {int(index): name for index, name in meta["names"].items()}
+    roadmap = Roadmap.fromArrays(arrays["positions"], arrays["indptr"], arrays["indices"], arrays["nodeIds"],
+                                 arrays["colors"], arrays["nodeTypes"], meta["colorTable"], meta["typeTable"], names)
+    roadmap.meta = meta
+    return roadmap
@@ -0,0 +1,91 @@
+# coding: utf-8
+
+"""
+Sampling strategies for the PRM planners. All samplers return points of the unit cube [0, 1)^dim,
+PRMBase scales them to the limits of the environment.
+
+    "uniform": pseudo-random (numpy.random.Generator)
+    "halton":  scrambled Halton sequence (scipy.stats.qmc)
+    "sobol":   scrambled Sobol sequence (scipy.stats.qmc)
+    "grid":    stratified grid, one jittered sample per cell in random order
+
+License is based on Creative Commons: Attribution-NonCommercial 4.0 International (CC BY-NC 4.0) (pls. check: http://creativecommons.org/licenses/by-nc/4.0/)
+"""
+
+from scipy.stats import qmc
+import numpy as np
+import math
+
+class Sampler(object):
+    """ Base class: sample(n) returns n points of the unit cube as array (n x dim). Consecutive calls
+    continue the sequence, so the union of all samples keeps its distribution properties"""
+
+    name = None
+
+    def __init__(self, dim, randomGenerator):
+        self.dim = dim
+        self.randomGenerator = randomGenerator
+        self._buffer = np.empty((0, dim))
+
+    def _block(self, n):
+        """ Generate the next block of at least n samples"""
+        raise NotImplementedError()
+
+    def sample(self, n):
+        while len(self._buffer) < n:
+            self._buffer = np.concatenate([self._buffer, self._block(n - len(self._buffer))])
+        result = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return result
+
+class UniformSampler(Sampler):
+
+    name = "uniform"
+
+    def _block(self, n):
+        return self.randomGenerator.random((n, self.dim))
+
+class HaltonSampler(Sampler):
+
+    name = "halton"
+
+    def __init__(self, dim, randomGenerator):
+        super(HaltonSampler, self).__init__(dim, randomGenerator)
+        self._engine = qmc.Halton(dim, scramble=True, seed=randomGenerator)
+
+    def _block(self, n):
+        return self._engine.random(n)
+
+class SobolSampler(Sampler):
+
+    name = "sobol"
+
+    def __init__(self, dim, randomGenerator):
+        super(SobolSampler, self).__init__(dim, randomGenerator)
+        self._engine = qmc.Sobol(dim, scramble=True, seed=randomGenerator)
+
+    def _block(self, n):
+        # Sobol points are balanced, if their total number is a power of 2, the rest is buffered for the next call
+        generated = self._engine.num_generated
+        total = 2**math.ceil(math.log2(generated + n))
+        return self._engine.random(total - generated)
+
+class GridSampler(Sampler):
+    """ Stratified sampling: the unit cube is divided into k^dim cells (k^dim >= n), every cell gets one
+    uniformly jittered sample, the cells are visited in random order"""
+
+    name = "grid"
+
+    def _block(self, n):
+        k = max(1, math.ceil(n**(1.0/self.dim)))
+        cells = np.stack(np.meshgrid(*[np.arange(k)]*self.dim, indexing="ij"), axis=-1).reshape(-1, self.dim)
+        cells = self.randomGenerator.permutation(cells)
+        return (cells + self.randomGenerator.random(cells.shape))/k
+
+samplers = {sampler.name: sampler for sampler in (UniformSampler, HaltonSampler, SobolSampler, GridSampler)}
+
+def createSampler(name, dim, randomGenerator):
+    """ Return a new sampler of the given name (s. samplers) for dim dimensions"""
+    if name not in samplers:
+        raise ValueError("Unknown sampler " + str(name) + ", use one of " + str(list(samplers)))
+    return samplers[name](dim, randomGenerator)
@@ -0,0 +1,162 @@
+# coding: utf-8
+
+"""
+Tour planning for roundtrips: find the order, in which the interim goals are visited, based on the
+shortest path distances in the roadmap instead of the straight-line distance to the nearest interim.
+
+License is based on Creative Commons: Attribution-NonCommercial 4.0 International (CC BY-NC 4.0) (pls. check: http://creativecommons.org/licenses/by-nc/4.0/)
+"""
+
+from HelperPackage.IPPerfMonitor import IPPerfMonitor
+
+from scipy.spatial.distance import euclidean
+import heapq
+import math
+
+def _edgeLength(graph, node1, node2):
+    """ Length of an edge: its 'weight' attribute or the Euclidean distance of both nodes"""
+    weight = graph.adj[node1][node2].get("weight")
+    if weight is None:
+        weight = euclidean(graph.nodes[node1]['pos'], graph.nodes[node2]['pos'])
+    return weight
+
+def shortestPathsToTerminals(graph, source, terminals):
+    """ Dijkstra from source, which stops as soon as all terminals are reached.
+
+    Returns dict terminal -> (distance, path) for all terminals reachable from source
+    """
+    remaining = set(terminals)
+    distance = {source: 0.0}
+    predecessor = {source: None}
+    settled = set()
+    result = dict()
+    queue = [(0.0, 0, source)]
+    counter = 1  # tie breaker, node names of different types can not be compared
+
+    while queue and remaining:
+        dist, _, node = heapq.heappop(queue)
+        if node in settled:
+            continue
+        settled.add(node)
+
+        if node in remaining:
+            remaining.discard(node)
+            path = [node]
+            while predecessor[path[-1]] is not None:
+                path.append(predecessor[path[-1]])
+            result[node] = (dist, path[::-1])
+
+        for neighbour in graph.adj[node]:
+            if neighbour in settled:
+                continue
+            newDist = dist + _edgeLength(graph, node, neighbour)
+            if newDist < distance.get(neighbour, math.inf):
+                distance[neighbour] = newDist
+                predecessor[neighbour] = node
+                heapq.heappush(queue, (newDist, counter, neighbour))
+                counter += 1
+
+    return result
+
+def heldKarpOrder(distance):
+    """ Exact shortest open tour starting at index 0 and visiting all indices of the distance matrix
+    (dynamic programming over subsets, O(2^n n²))"""
+    n = len(distance)
+    if n <= 2:
+        return list(range(n))
+
+    # cost[(mask, last)]: shortest path from 0 over the goals in mask (bit i-1 for goal i) ending at last,
+    # together with the goal visited before last
+    layer = {(1 << (i - 1), i): (distance[0][i], 0) for i in range(1, n)}
+    cost = dict(layer)
+    for size in range(2, n):
+        newLayer = dict()
+        for (mask, last), (dist, _) in layer.items():
+            for nxt in range(1, n):
+                bit = 1 << (nxt - 1)
+                if mask & bit:
+                    continue
+                key = (mask | bit, nxt)
+                newDist = dist + distance[last][nxt]
+                if key not in newLayer or newDist < newLayer[key][0]:
+                    newLayer[key] = (newDist, last)
+        cost.update(newLayer)
+        layer = newLayer
+
+    fullMask = (1 << (n - 1)) - 1
+    last = min(range(1, n), key=lambda i: cost[(fullMask, i)][0])
+
+    order = []
+    mask = fullMask
+    while last != 0:
+        order.append(last)
+        previous = cost[(mask, last)][1]
+        mask &= ~(1 << (last - 1))
+        last = previous
+    order.append(0)
+    return order[::-1]
+
+def twoOptOrder(distance):
+    """ Heuristic open tour starting at index 0: nearest neighbour tour improved by 2-opt moves"""
+    n = len(distance)
+    order = [0]
+    unvisited = set(range(1, n))
+    while unvisited:
+        nxt = min(unvisited, key=lambda i: distance[order[-1]][i])
+        order.append(nxt)
+        unvisited.discard(nxt)
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            for k in range(i + 1, n):
+                # reverse order[i:k+1], the end of an open tour has no successor
+                before = distance[order[i - 1]][order[i]] + (distance[order[k]][order[k + 1]] if k + 1 < n else 0.0)
+                after = distance[order[i - 1]][order[k]] + (distance[order[i]][order[k + 1]] if k + 1 < n else 0.0)
+                if after < before - 1e-12:
+                    order[i:k + 1] = order[i:k + 1][::-1]
+                    improved = True
+    return order
+
+@IPPerfMonitor
+def computeTour(graph, startNode, goalNodes, exactLimit=10):
+    """ Find the order of the goals with the shortest roadmap path starting at startNode.
+
+    One Dijkstra per terminal computes the distances between all terminals, the order is solved exactly
+    (Held-Karp) for up to exactLimit goals, otherwise by 2-opt.
+
+    Returns (list of terminals in visiting order, dict (terminal1, terminal2) -> path) or (None, None),
+    if a terminal is missing or not reachable
+    """
+    terminals = [startNode] + list(goalNodes)
+    if any(terminal not in graph for terminal in terminals):
+        return None, None
+
+    distance = [[0.0]*len(terminals) for _ in terminals]
+    segments = dict()
+    for i, terminal in enumerate(terminals):
+        paths = shortestPathsToTerminals(graph, terminal, terminals)
+        if len(paths) < len(terminals):
+            return None, None
+        for j, other in enumerate(terminals):
+            distance[i][j], segments[(terminal, other)] = paths[other]
+
+    if len(goalNodes) <= exactLimit:
+        order = heldKarpOrder(distance)
+    else:
+        order = twoOptOrder(distance)
+
+    return [terminals[i] for i in order], segments
+
+def planTour(graph, startNode, goalNodes, exactLimit=10):
+    """ Return the path (list of node names) from startNode through all goals in the order of the
+    shortest tour, stitched from the shortest paths between the terminals ([] if there is none)"""
+    order, segments = computeTour(graph, startNode, goalNodes, exactLimit)
+    if order is None:
+        return []
+
+    path = [startNode]
+    for terminal1, terminal2 in zip(order[:-1], order[1:]):
+        path.extend(segments[(terminal1, terminal2)][1:])
+    return path
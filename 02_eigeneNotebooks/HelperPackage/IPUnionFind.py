@@ -0,0 +1,91 @@
+# coding: utf-8
+
+"""
+Disjoint-set structure to keep track of the connected components of a growing roadmap.
+
+License is based on Creative Commons: Attribution-NonCommercial 4.0 International (CC BY-NC 4.0) (pls. check: http://creativecommons.org/licenses/by-nc/4.0/)
+"""
+
+class UnionFind(object):
+    """ Union-find with union by size and path halving.
+
+    add() a node for every node of the graph and union() both ends of every edge, then
+    connected() answers in O(α(N)) whether two nodes are part of the same connected component.
+    Removing nodes or edges is not supported.
+    """
+
+    def __init__(self, elements=()):
+        self.clear()
+        for element in elements:
+            self.add(element)
+
+    def clear(self):
+        """ Remove all elements"""
+        self._parent = dict()
+        self._size = dict()
+        self.numComponents = 0
+
+    def __contains__(self, element):
+        return element in self._parent
+
+    def __len__(self):
+        return len(self._parent)
+
+    def add(self, element):
+        """ Add element as a new component of its own (nothing happens, if it is already known)"""
+        if element not in self._parent:
+            self._parent[element] = element
+            self._size[element] = 1
+            self.numComponents += 1
+
+    def addComponents(self, elements, labels):
+        """ Add new elements with known component labels (e.g. of scipy.sparse.csgraph.connected_components)
+        in one pass: elements with the same label form one component"""
+        roots = dict()  # label -> representative
+        for element, label in zip(elements, labels):
+            root = roots.setdefault(label, element)
+            self._parent[element] = root
+            self._size[root] = self._size.get(root, 0) + 1
+        self.numComponents += len(roots)
+
+    def find(self, element):
+        """ Return the representative of the component of element"""
+        parent = self._parent
+        while parent[element] != element:
+            parent[element] = parent[parent[element]]
+            element = parent[element]
+        return element
+
+    def union(self, element1, element2):
+        """ Merge the components of both elements. Returns the representative of the merged
+        component, unknown elements are added first"""
+        self.add(element1)
+        self.add(element2)
+        root1 = self.find(element1)
+        root2 = self.find(element2)
+        if root1 == root2:
+            return root1
+
+        if self._size[root1] < self._size[root2]:
+            root1, root2 = root2, root1
+        self._parent[root2] = root1
+        self._size[root1] += self._size[root2]
+        self.numComponents -= 1
+        return root1
+
+    def connected(self, element1, element2):
+        """ Return whether both elements are part of the same component"""
+        if element1 not in self._parent or element2 not in self._parent:
+            return element1 == element2
+        return self.find(element1) == self.find(element2)
+
+    def componentSize(self, element):
+        """ Return the number of elements in the component of element"""
+        return self._size[self.find(element)]
+
+    def components(self):
+        """ Return dict representative -> list of elements of the component (O(N))"""
+        result = dict()
+        for element in self._parent:
+            result.setdefault(self.find(element), []).append(element)
+        return result
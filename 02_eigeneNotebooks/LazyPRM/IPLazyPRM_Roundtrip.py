@@ -6,178 +6,263 @@ License is based on Creative Commons: Attribution-NonCommercial 4.0 Internationa
 """
 
 from HelperPackage.IPPRMBase import PRMBase
-from scipy.spatial import cKDTree
 import networkx as nx
 from scipy.spatial.distance import euclidean
 from HelperPackage import HelperClass
 
 from HelperPackage.IPPerfMonitor import IPPerfMonitor
+from HelperPackage.IPIndexedGraph import PositionIndexedGraph
+from HelperPackage.IPNearestNeighbour import IncrementalKDTree
+from HelperPackage.IPEdgeStates import EdgeStateRegistry
+from HelperPackage.IPPathTools import removeLoops
+from HelperPackage.IPTourPlanner import computeTour
 
 class LazyPRM(PRMBase):
 
+    # the path search uses the edge lengths, loaded roadmaps get them in bulk (s. PRMBase.loadRoadmap)
+    _roadmapEdgeWeights = True
+
     def __init__(self, _collChecker):
         super(LazyPRM, self).__init__(_collChecker)
         
-        self.graph = nx.Graph()
+        self.graph = PositionIndexedGraph()
         self.lastGeneratedNodeNumber = 0
-        self.collidingEdges = []
-        self.nonCollidingEdges =[]
+        self.edgeStates = EdgeStateRegistry()
+        self.kdTree = IncrementalKDTree()
+        self.checkedNodes = set()
+
+    @property
+    def collidingEdges(self):
+        """ List of all edges found colliding (in the order they were checked)"""
+        return self.edgeStates.edges(EdgeStateRegistry.COLLIDING)
+
+    @property
+    def nonCollidingEdges(self):
+        """ List of all edges found collision free (in the order they were checked)"""
+        return self.edgeStates.edges(EdgeStateRegistry.FREE)
         
-    
-
-    def _getNodeNamebasedOnCoordinates(self,coordinates):
-        # Initialize node name
-        nodeName = ""
-        
-        # Loop through all nodes and their attributes in the graph
-        for node, attributes in self.graph.nodes(data=True):
-            
-            # Check if the current node has a "pos" attribute
-            if "pos" in attributes:
-                
-                # Check if the coordinates match the "pos" attribute of the current node
-                if coordinates == attributes["pos"]:
-                    
-                    # Assign the name of the current node to nodeName and exit the loop
-                    nodeName = node
-                    break
-        
-        # Return the name of the node based on the provided coordinates
-        return nodeName
-    
-    @IPPerfMonitor
-    def _nearestInterim(self,currentNode,checkedInterimGoalList):
-        
-        # List 1: Coordinates
-        # List 2: Distance
-        # List 3: Name
-        result_interim = [[],[],[]]
-        
-        # Loop over all checked interim goals
-        i = 0
-        for next_pos_node in checkedInterimGoalList:
-            
-            # Current position and position of the next interim goal
-            point_current = (currentNode[0] , currentNode[1])
-            point_pos_next = (next_pos_node[0],next_pos_node[1])
-
-            # Add coordinates and distance to the result list
-            result_interim[0].append(next_pos_node)
-            result_interim[1].append(euclidean(point_current,point_pos_next))
-            i += 1
-            
-       
-        # Assign names to the nearest points
-        for nearest in result_interim[0]:
-            for node, attributes in self.graph.nodes(data=True):
-                if "pos" in attributes:
-                    if nearest == attributes["pos"]:
-                        result_interim[2].append(node)
-                        break
-                        
-        # Find the minimum distance and the index of the nearest interim goal
-        minimum_value = min(result_interim[1])
-        minimum_index = result_interim[1].index(minimum_value)
-        
-        # Return the information of the nearest interim goal
-        return [result_interim[0][minimum_index], result_interim[1][minimum_index],result_interim[2][minimum_index]]
+    def _addNode(self, nodeName, pos, **attr):
+        """ Add node to graph and to the kd-tree of all node positions"""
+        self.graph.add_node(nodeName, pos=pos, **attr)
+        self.kdTree.insert(nodeName, pos)
+
+    def _removeNode(self, nodeName):
+        """ Remove node from graph and from the kd-tree"""
+        self.graph.remove_node(nodeName)
+        self.kdTree.remove(nodeName)
+
+    def _removeTerminals(self):
+        """ Remove start and interims of the previous query, their names are used for the new ones"""
+        for node in self._terminalNodes():
+            self._removeNode(node)
+            self.edgeStates.removeNode(node)
+            self.checkedNodes.discard(node)
+
+    def _restoreRoadmap(self, roadmapParameters, roadmap):
+        """ Rebuild the kd-tree of a loaded roadmap (s. PRMBase.loadRoadmap) in bulk from its arrays, the edge
+        weights are set by Roadmap.toNetworkx. The collision checks are not saved, all nodes and edges are
+        validated again when they are used"""
+        self.kdTree.clear()
+        self.kdTree.insertMany(roadmap.nodeNames(), roadmap.positions)
+        self.lastGeneratedNodeNumber = self._maxNodeNumber() + 1
+        self.edgeStates.clear()
+        self.checkedNodes = set()
 
     @IPPerfMonitor
     def _buildRoadmap(self, numNodes, kNearest):
         
-        # generate #numNodes nodes
+        # generate #numNodes nodes (one batch of random positions)
         addedNodes = []
         
-        for i in range(numNodes):
-            pos = self._getRandomPosition()
-            self.graph.add_node(self.lastGeneratedNodeNumber, pos=pos)
+        for pos in self._getRandomPositions(numNodes).tolist():
+            self._addNode(self.lastGeneratedNodeNumber, pos)
             addedNodes.append(self.lastGeneratedNodeNumber)
             self.lastGeneratedNodeNumber += 1
 
+        self._connectNodes(addedNodes, kNearest)
 
-        # for every node in graph find nearest neigbhours
-        posList = list(nx.get_node_attributes(self.graph,'pos').values())
+    def _connectNodes(self, nodes, kNearest):
+        """ Add edges from every node of nodes to its kNearest neighbours (without collision check)"""
+        if nodes == []:
+            return
 
-        kdTree = cKDTree(posList)
-        
-        # to see when _buildRoadmap has to be called again
-        for node in addedNodes:
+        # find the nearest neighbours of all new nodes with one query, the kd-tree is kept between
+        # the calls and returns node names directly, so no lookup over all nodes is needed
+        addedPositions = [self.graph.nodes[node]['pos'] for node in nodes]
+        neighbours = self.kdTree.queryKNearest(addedPositions, kNearest)
 
-            # Find set of candidates to connect to sorted by distance
-            result = kdTree.query(self.graph.nodes[node]['pos'],k=kNearest)
-            for data in result[1]:
-                c_node = [x for x, y in self.graph.nodes(data=True) if (y['pos']==posList[data])][0]
+        for node, candidates in zip(nodes, neighbours):
+
+            # Set of candidates to connect to sorted by distance
+            for distance, c_node in candidates:
                 if node!=c_node:
-                    if (node, c_node) not in self.collidingEdges:
-                        self.graph.add_edge(node,c_node)
+                    # edges known to be colliding are not added again (in both orientations)
+                    if not self.edgeStates.isColliding(node, c_node):
+                        self.graph.add_edge(node,c_node, weight=distance)
                     else:
                         continue
     
     @IPPerfMonitor
     def _checkForCollisionAndUpdate(self,step, path):
 
+        stepName = self._getNodeNamebasedOnCoordinates(step)
+        pathName = self._getNodeNamebasedOnCoordinates(path)
+
+        # edges validated before (also during earlier expansions of the roadmap) are not checked again,
+        # a free edge implies free nodes
+        if self.edgeStates.isFree(stepName, pathName):
+            return False
+
         # first check all nodes
         if self._collisionChecker.pointInCollision(step):
             
             # Remove node if collision is detected
-            self.graph.remove_node(self._getNodeNamebasedOnCoordinates(step))
+            self._removeNode(stepName)
             return True
 
-        step = self._getNodeNamebasedOnCoordinates(step)
-        path = self._getNodeNamebasedOnCoordinates(path) 
-
         # Check all edges
-        if self._collisionChecker.lineInCollision(self.graph.nodes()[step]['pos'], self.graph.nodes()[path]['pos']):
+        if self._collisionChecker.lineInCollision(self.graph.nodes()[stepName]['pos'], self.graph.nodes()[pathName]['pos']):
             
             # Remove edge if collision is detected
-            self.graph.remove_edge(step,path)
-            self.collidingEdges.append((step,path))
+            self.graph.remove_edge(stepName,pathName)
+            self.edgeStates.markColliding(stepName,pathName)
 
             return True
         else:
 
-            self.nonCollidingEdges.append((step,path))
+            self.edgeStates.markFree(stepName,pathName)
 
         return False
     
-    def _findDuplicate(self, subPath):
-        
-        # Initialize an empty list to store duplicate elements
-        duplicate = []
-        
-        # Iterate over each element in the subPath list
-        for i in range(len(subPath)):
-            # Nested loop to compare each element with the remaining elements
-            for j in range(i + 1, len(subPath)):
-                
-                # Check if the elements are equal and the element is not already in the 'duplicate' list
-                if subPath[i] == subPath[j] and subPath[i] not in duplicate:
-                    
-                    # Add the duplicate element to the 'duplicate' list
-                    duplicate.append(subPath[i])
-        
-        # If no duplicates were found, return an empty list
-        if duplicate == []:
-            return []
-        
-        # Return the first duplicate found (only the first one is returned, even if there are more)
-        return duplicate[0]
+    def _euclideanHeuristic(self, node1, node2):
+        return euclidean(self.graph.nodes[node1]['pos'], self.graph.nodes[node2]['pos'])
 
-    def _removeDuplicate(self, subPath, duplicate):
-        
-        # Find the indices of all occurrences of the duplicate element in the subPath list
-        indexList = [index for index, element in enumerate(subPath) if element == duplicate]
-        
-        # Get the start and end indices of the duplicate occurrences
-        start = indexList[0]
-        end = indexList[-1]
+    @IPPerfMonitor
+    def _validatePath(self, path):
+        """ Check a candidate path lazily: first all unchecked nodes, then all unchecked edges with
+        the longest (most likely colliding) edge first. Checking stops at the first invalid element,
+        which is removed from the graph.
+
+        Returns True, if the whole path is collision free """
+
+        # nodes first, a colliding node invalidates all its edges at once
+        for node in path:
+            if node in self.checkedNodes:
+                continue
+            if self._collisionChecker.pointInCollision(self.graph.nodes[node]['pos']):
+                self._removeNode(node)
+                return False
+            self.checkedNodes.add(node)
+
+        # unchecked edges, longest first
+        uncheckedEdges = [(node1, node2) for node1, node2 in zip(path[:-1], path[1:]) if not self.edgeStates.isFree(node1, node2)]
+        uncheckedEdges.sort(key=lambda edge: self.graph.edges[edge]['weight'], reverse=True)
+
+        for node1, node2 in uncheckedEdges:
+            if self._collisionChecker.lineInCollision(self.graph.nodes[node1]['pos'], self.graph.nodes[node2]['pos']):
+                self.graph.remove_edge(node1, node2)
+                self.edgeStates.markColliding(node1, node2)
+                return False
+            self.edgeStates.markFree(node1, node2)
+
+        return True
+
+    @IPPerfMonitor
+    def _lazyShortestPath(self, source, target, config, maxTry):
+        """ Search the Euclidean shortest path with A*, validate it and remove invalid nodes and edges
+        until a collision free path is found. The roadmap only grows, if source and target are not connected
+        anymore in the remaining graph.
+
+        Returns the path and the number of remaining roadmap extensions ([] if no path is found) """
+
+        while True:
+            try:
+                candidatePath = nx.astar_path(self.graph, source, target, heuristic=self._euclideanHeuristic, weight="weight")
+            except nx.NetworkXNoPath:
+                if maxTry <= 0:
+                    return [], maxTry
+                self._buildRoadmap(config["updateRoadmapSize"], config["kNearest"])
+                maxTry -= 1
+                continue
+
+            if self._validatePath(candidatePath):
+                return candidatePath, maxTry
+
+    @IPPerfMonitor
+    def _planRoundPathLazy(self, checkedStartList, checkedInterimGoalList, config, maxIterations):
+        """ Roundtrip with lazy search: always plan to the nearest remaining interim goal, interim goals
+        passed on the way count as reached """
+
+        path = ["start"]
+        currentPos = checkedStartList[0]
+        remainingInterims = list(checkedInterimGoalList)
+        maxTry = maxIterations
+
+        while remainingInterims != []:
+
+            # Calculate shortest distance to nearest interim
+            result_interim = self._nearestInterim(currentPos, remainingInterims)
+
+            subPath, maxTry = self._lazyShortestPath(path[-1], result_interim[2], config, maxTry)
+            if subPath == []:
+                HelperClass.HelperClass.printInColor("No Path found", 'red')
+                return []
+
+            # Remove first path element to avoid duplicates in path
+            path.extend(subPath[1:])
+
+            # all interims on the path segment are reached
+            for node in subPath[1:]:
+                nodePos = self.graph.nodes[node]['pos']
+                if str(node).startswith("interim") and nodePos in remainingInterims:
+                    remainingInterims.remove(nodePos)
+
+            currentPos = self.graph.nodes[path[-1]]['pos']
+
+        HelperClass.HelperClass.printInColor("Solution =  " + str(path), 'lawngreen')
+        return path
+
+    @IPPerfMonitor
+    def _planRoundPathTour(self, checkedInterimGoalList, config, maxIterations):
+        """ Roundtrip in the order of the shortest tour through the (not yet validated) roadmap, every leg
+        of the tour is validated with the lazy search """
+
+        interimNames = ["interim" + str(i) for i in range(len(checkedInterimGoalList))]
+        maxTry = maxIterations
+        maxTourIterations = 5
+
+        # grow the roadmap until all interims are reachable from start
+        order, _ = computeTour(self.graph, "start", interimNames, config.get("tourExactLimit", 10))
+        while order is None:
+            if maxTry <= 0:
+                HelperClass.HelperClass.printInColor("No Path found", 'red')
+                return []
+            self._buildRoadmap(config["updateRoadmapSize"], config["kNearest"])
+            maxTry -= 1
+            order, _ = computeTour(self.graph, "start", interimNames, config.get("tourExactLimit", 10))
+
+        # validate the legs of the tour, invalid edges found on the way may change the best order,
+        # so the order is computed again until it is stable
+        for iteration in range(maxTourIterations):
+            path = ["start"]
+            for interim in order[1:]:
+                subPath, maxTry = self._lazyShortestPath(path[-1], interim, config, maxTry)
+                if subPath == []:
+                    HelperClass.HelperClass.printInColor("No Path found", 'red')
+                    return []
+                path.extend(subPath[1:])
+
+            newOrder, _ = computeTour(self.graph, "start", interimNames, config.get("tourExactLimit", 10))
+            if newOrder == order:
+                break
+            order = newOrder
+
+        # Remove loops, the first visits of start and interims are kept
+        path = removeLoops(path, fixed=["start"] + interimNames)
+
+        HelperClass.HelperClass.printInColor("Solution =  " + str(path), 'lawngreen')
+        return path
 
-        # Create a modified subPath by concatenating the portions before and after the duplicate occurrences
-        modSubPath = subPath[:start + 1] + subPath[end + 1:]
-        
-        # Return the modified subPath without the duplicate occurrences
-        return modSubPath
-        
     @IPPerfMonitor   
     def planRoundPath(self, startList, interimGoalList, config):
         
@@ -192,33 +277,69 @@ class LazyPRM(PRMBase):
             config["initialRoadmapSize"] = 40 # number of nodes of first roadmap
             config["updateRoadmapSize"]  = 20 # number of nodes to add if there is no connection from start to end
             config["kNearest"] = 5 # number of nodes to connect to during setup
+            config["lazySearch"] = True # optional: validate whole A* paths (Euclidean edge weights) instead of
+                                        # walking the path step by step, the roadmap only grows, if there is
+                                        # no path left in the graph
+            config["tourPlanning"] = True # optional: visit the interims in the order of the shortest tour
+                                          # through the roadmap, every leg is validated by the lazy search
+            config["multiQuery"] = True # optional: keep the roadmap and all collision checks of the previous call
+                                        # (same collision checker, unchanged scene, same initialRoadmapSize/kNearest),
+                                        # only start and interims are replaced
+            config["seed"] = 42 # optional: seed of the random generator (reproducible runs)
+            config["sampler"] = "halton" # optional: "uniform" (default), "halton", "sobol" or "grid" (s. IPSampler)
         """
           
-        # 0. reset
-        self.graph.clear()
-        self.lastGeneratedNodeNumber = 0
-        self.collidingEdges = []
+        roadmapParameters = (config["initialRoadmapSize"], config["kNearest"])
+        multiQuery = self._canReuseRoadmap(config, roadmapParameters)
+        self._initSampling(config)
+
+        # 0. reset (in multi-query mode only the terminals of the previous query are removed)
+        if multiQuery:
+            self._removeTerminals()
+        else:
+            self._forgetRoadmap()
+            self.graph.clear()
+            self.kdTree.clear()
+            self.lastGeneratedNodeNumber = 0
+            self.edgeStates.clear()
+            self.checkedNodes = set()
         
         # 1. check start and goal whether collision free (s. BaseClass)
         checkedStartList, checkedInterimGoalList = self._checkStartGoal(startList, interimGoalList)
         
         # 2. add start to graph
-        self.graph.add_node("start", pos=checkedStartList[0])
+        self._addNode("start", checkedStartList[0])
 
         # Add Interims to graph
         for interimGoal in range(len(checkedInterimGoalList)):
             
             nameOfNode = "interim" + str(interimGoal)
 
-            self.graph.add_node(nameOfNode, pos=checkedInterimGoalList[interimGoal])
+            self._addNode(nameOfNode, checkedInterimGoalList[interimGoal])
+
+        self._initInterimTable(checkedInterimGoalList)
         
-        # 3. build initial roadmap
-        self._buildRoadmap(config["initialRoadmapSize"], config["kNearest"])
+        # start and interims are already checked by _checkStartGoal
+        terminals = ["start"] + ["interim" + str(i) for i in range(len(checkedInterimGoalList))]
+        self.checkedNodes.update(terminals)
+
+        # 3. build initial roadmap (or connect the new terminals to the existing one)
+        if multiQuery:
+            self._connectNodes(terminals, config["kNearest"])
+        else:
+            self._buildRoadmap(config["initialRoadmapSize"], config["kNearest"])
+            self._rememberRoadmap(roadmapParameters)
         
         maxTry = 0
         coordinatesLastPathEle = []
         maxIterations = 100
 
+        if config.get("tourPlanning", False):
+            return self._planRoundPathTour(checkedInterimGoalList, config, maxIterations)
+
+        if config.get("lazySearch", False):
+            return self._planRoundPathLazy(checkedStartList, checkedInterimGoalList, config, maxIterations)
+
         try:
 
             # Calculate shortest distance to nearest interim from start 
@@ -283,17 +404,9 @@ class LazyPRM(PRMBase):
                         # Check if the distance to the new interim is zero (Interim is reached)
                         if new_result_interim[1] == 0.0:
 
-                            # Optimize last path segment                          
-                            subPath = path[path.index(previousInterim[2]):]
-
-                            while(self._findDuplicate(subPath) != []):
-                                duplicate = self._findDuplicate(subPath)
-                                modSubPath = self._removeDuplicate(subPath, duplicate)
-                                subPath = modSubPath
-                            if subPath != path[path.index(previousInterim[2]):]:
-
-                                # overwrite actual path with optimized path segment
-                                path = path[:path.index(previousInterim[2])] + subPath
+                            # Optimize last path segment (remove loops since the previous interim)
+                            segmentStart = path.index(previousInterim[2])
+                            path = path[:segmentStart] + removeLoops(path[segmentStart:])
 
 
                             # Check if there is only one interim goal remaining, this means all interims are reached
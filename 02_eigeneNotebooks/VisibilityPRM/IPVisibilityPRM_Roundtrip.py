@@ -10,7 +10,9 @@ from HelperPackage.IPPRMBase import PRMBase
 import networkx as nx
 from scipy.spatial import cKDTree
 from HelperPackage.IPPerfMonitor import IPPerfMonitor
-from scipy.spatial.distance import euclidean
+from HelperPackage.IPIndexedGraph import PositionIndexedGraph
+from HelperPackage.IPUnionFind import UnionFind
+from HelperPackage.IPPathTools import removeLoops
 from HelperPackage import HelperClass
 
 
@@ -32,67 +34,15 @@ class VisPRM(PRMBase):
 
     def __init__(self, _collChecker, _statsHandler = None):
         super(VisPRM, self).__init__(_collChecker)
-        self.graph = nx.Graph()
+        self.graph = PositionIndexedGraph()
+        self.connectedComponents = UnionFind()
+        self.guardsOfComponent = dict()
+        self.lastGeneratedNodeNumber = 0
         self.statsHandler = VisibilityStatsHandler() # not yet fully customizable (s. parameters of constructors)
                 
     def _isVisible(self, pos, guardPos):
         return not self._collisionChecker.lineInCollision(pos, guardPos)
 
-    def _getNodeNamebasedOnCoordinates(self,coordinates):
-        # Initialize node name
-        nodeName = ""
-        
-        # Loop through all nodes and their attributes in the graph
-        for node, attributes in self.graph.nodes(data=True):
-            # Check if the current node has a "pos" attribute
-            if "pos" in attributes:
-                # Check if the coordinates match the "pos" attribute of the current node
-                if coordinates == attributes["pos"]:
-                    # Assign the name of the current node to nodeName and exit the loop
-                    nodeName = node
-                    break
-        
-        # Return the name of the node based on the provided coordinates
-        return nodeName
-    
-    @IPPerfMonitor
-    def _nearestInterim(self,currentNode,checkedInterimGoalList):
-        
-        # List 1: Coordinates
-        # List 2: Distance
-        # List 3: Name
-        result_interim = [[],[],[]]
-        
-        # Loop over all checked interim goals
-        i = 0
-        for next_pos_node in checkedInterimGoalList:
-            
-            # Current position and position of the next interim goal
-            point_current = (currentNode[0] , currentNode[1])
-            point_pos_next = (next_pos_node[0],next_pos_node[1])
-
-            # Add coordinates and distance to the result list
-            result_interim[0].append(next_pos_node)
-            result_interim[1].append(euclidean(point_current,point_pos_next))
-            i += 1
-            
-       
-        # Assign names to the nearest points
-        for nearest in result_interim[0]:
-            for node, attributes in self.graph.nodes(data=True):
-                if "pos" in attributes:
-                    if nearest == attributes["pos"]:
-                        result_interim[2].append(node)
-                        break
-                        
-        # Find the minimum distance and the index of the nearest interim goal
-        minimum_value = min(result_interim[1])
-        minimum_index = result_interim[1].index(minimum_value)
-        
-        # Return the information of the nearest interim goal
-        return [result_interim[0][minimum_index], result_interim[1][minimum_index],result_interim[2][minimum_index]]
-    
-
     @IPPerfMonitor
     def _checkConnectableInterims(self, checkedStartList,checkedInterimGoalList):
         
@@ -114,12 +64,104 @@ class VisPRM(PRMBase):
         checkedInterimGoalList.remove(checkedStartList[0])
 
 
+    def _initComponents(self):
+        """ Build the component bookkeeping from the current graph (one traversal). Afterwards
+        it is updated incrementally: union-find over all nodes and for every component
+        (by its representative) the list of its guards"""
+        self.connectedComponents.clear()
+        self.guardsOfComponent = dict()
+
+        for comp in nx.connected_components(self.graph):
+            comp = list(comp)
+            for node in comp:
+                self.connectedComponents.union(comp[0], node)
+            guards = [node for node in comp if self.graph.nodes()[node]['nodeType'] == 'Guard']
+
+            # components without guards (left over after removing terminals) can not be connected by samples
+            if guards != []:
+                self.guardsOfComponent[self.connectedComponents.find(comp[0])] = guards
+
+    def _addGuard(self, nodeNumber, q_pos):
+        """ Add a guard, which forms a new component"""
+        self.graph.add_node(nodeNumber, pos = q_pos, color='red', nodeType = 'Guard')
+        self.connectedComponents.add(nodeNumber)
+        self.guardsOfComponent[nodeNumber] = [nodeNumber]
+
+    def _addConnection(self, nodeNumber, q_pos, guard1, guard2):
+        """ Add a connection node between two guards of different components and merge the components"""
+        self.graph.add_node(nodeNumber, pos = q_pos, color='lightblue', nodeType = 'Connection')
+        self.graph.add_edge(nodeNumber, guard1)
+        self.graph.add_edge(nodeNumber, guard2)
+
+        root1 = self.connectedComponents.find(guard1)
+        root2 = self.connectedComponents.find(guard2)
+        guards = self.guardsOfComponent.pop(root1)
+        if root2 != root1:
+            guards += self.guardsOfComponent.pop(root2)
+
+        self.connectedComponents.union(guard1, nodeNumber)
+        self.guardsOfComponent[self.connectedComponents.union(guard1, guard2)] = guards
+
+    def _removeTerminals(self):
+        """ Remove start and interims of the previous query (the component bookkeeping is rebuilt by
+        _initComponents)"""
+        neighbours = set()
+        for node in self._terminalNodes():
+            neighbours.update(self.graph.adj[node])
+            self.graph.remove_node(node)
+
+        # connections, which only led to a terminal, are dead ends now
+        for node in neighbours:
+            if node in self.graph and self.graph.nodes[node]['nodeType'] == 'Connection' and self.graph.degree(node) < 2:
+                self.graph.remove_node(node)
+
+    def _restoreRoadmap(self, roadmapParameters, roadmap):
+        """ New nodes of a loaded roadmap are numbered after its nodes, the components are rebuilt by
+        _initComponents (s. PRMBase.loadRoadmap)"""
+        self.lastGeneratedNodeNumber = self._maxNodeNumber() + 1
+
+    def _addTerminalEdge(self, terminal, guard):
+        """ Connect a terminal directly to a visible guard and merge both components"""
+        self.graph.add_edge(terminal, guard)
+
+        root1 = self.connectedComponents.find(terminal)
+        root2 = self.connectedComponents.find(guard)
+        if root1 != root2:
+            guards = self.guardsOfComponent.pop(root1) + self.guardsOfComponent.pop(root2)
+            self.guardsOfComponent[self.connectedComponents.union(terminal, guard)] = guards
+
+    @IPPerfMonitor
+    def _attachTerminals(self):
+        """ Multi-query: connect every terminal to one visible guard of every other component of the
+        existing roadmap. Returns True, if all terminals are part of one component afterwards"""
+        self._initComponents()
+        terminals = self._terminalNodes()
+
+        for terminal in terminals:
+            terminalPos = self.graph.nodes[terminal]['pos']
+            for comp, guards in list(self.guardsOfComponent.items()):
+
+                # skip components merged in the meantime and the own component
+                if comp not in self.guardsOfComponent or self.connectedComponents.connected(terminal, guards[0]):
+                    continue
+
+                for g in guards:
+                    if self._isVisible(terminalPos, self.graph.nodes()[g]['pos']):
+                        self._addTerminalEdge(terminal, g)
+                        break
+
+        return all(self.connectedComponents.connected(terminals[0], terminal) for terminal in terminals)
+
     @IPPerfMonitor
     def _learnRoadmap(self, ntry):
 
-        nodeNumber = 0
+        # continue the numbering of an existing roadmap (multi-query)
+        nodeNumber = self.lastGeneratedNodeNumber
         currTry = 0
 
+        # connected components and their guards, updated with every new node
+        self._initComponents()
+
         # Iterate as long as current try is less than ntry
         while currTry < ntry:
             
@@ -134,44 +176,41 @@ class VisPRM(PRMBase):
             # every connected component represents one guard
             merged = False
             
-            for comp in nx.connected_components(self.graph): # Impliciteley represents G_vis
+            for comp, guards in list(self.guardsOfComponent.items()): # Impliciteley represents G_vis
                 found = False
                 merged = False
                 
-                for g in comp: # connected components consists of guards and connection: only test nodes of type 'Guards'
+                for g in guards: # only the guards of the connected component are tested, connections are not stored
                     
-                    if self.graph.nodes()[g]['nodeType'] == 'Guard':
-                        
-                        if self.statsHandler:
-                            self.statsHandler.addVisTest(nodeNumber, g)
-                        
-                        if self._isVisible(q_pos,self.graph.nodes()[g]['pos']):
-                            found = True
-                            
-                            if g_vis == None:
-                                g_vis = g
-                            else:
-                                self.graph.add_node(nodeNumber, pos = q_pos, color='lightblue', nodeType = 'Connection')
-                                self.graph.add_edge(nodeNumber, g)
-                                self.graph.add_edge(nodeNumber, g_vis)
-                                merged = True
+                    if self.statsHandler:
+                        self.statsHandler.addVisTest(nodeNumber, g)
+                    
+                    if self._isVisible(q_pos,self.graph.nodes()[g]['pos']):
+                        found = True
                         
-                        # break, if node was visible,because visibility from one node of the guard is sufficient...
-                        if found == True: break;
+                        if g_vis == None:
+                            g_vis = g
+                        else:
+                            self._addConnection(nodeNumber, q_pos, g, g_vis)
+                            merged = True
+                    
+                    # break, if node was visible,because visibility from one node of the guard is sufficient...
+                    if found == True: break;
                 
-                # break, if connection was found. Reason: computed connected components (comp) are not correct any more, 
-                # they've changed because of merging
+                # break, if connection was found. Reason: the bookkeeping of the components has changed because of merging
                 if merged == True:
                     break;                    
 
             if (merged==False) and (g_vis == None):
-                self.graph.add_node(nodeNumber, pos = q_pos, color='red', nodeType = 'Guard')
+                self._addGuard(nodeNumber, q_pos)
                 currTry = 0
             else:
                 currTry += 1
 
             nodeNumber += 1
 
+        self.lastGeneratedNodeNumber = nodeNumber
+
     @IPPerfMonitor
     def planRoundPath(self, startList, interimGoalList, config):
         """
@@ -184,10 +223,25 @@ class VisPRM(PRMBase):
         Example:
         
             config["ntry"] = 40 
+            config["tourPlanning"] = True # optional: visit the interims in the order of the shortest tour
+                                          # through the roadmap instead of switching to the nearest interim
+            config["multiQuery"] = True # optional: keep the roadmap of the previous call (same collision checker,
+                                        # unchanged scene, same ntry), only start and interims are replaced
+            config["seed"] = 42 # optional: seed of the random generator (reproducible runs)
+            config["sampler"] = "halton" # optional: "uniform" (default), "halton", "sobol" or "grid" (s. IPSampler)
         
         """
-        # 0. reset
-        self.graph.clear()
+        roadmapParameters = (config["ntry"],)
+        multiQuery = self._canReuseRoadmap(config, roadmapParameters)
+        self._initSampling(config)
+
+        # 0. reset (in multi-query mode only the terminals of the previous query are removed)
+        if multiQuery:
+            self._removeTerminals()
+        else:
+            self._forgetRoadmap()
+            self.graph.clear()
+            self.lastGeneratedNodeNumber = 0
         
         # 1. check start and goal whether collision free (s. BaseClass)
         checkedStartList, checkedInterimGoalList = self._checkStartGoal(startList, interimGoalList)
@@ -206,13 +260,24 @@ class VisPRM(PRMBase):
         
         # Connect interims which see each other
         self._checkConnectableInterims(checkedStartList,checkedInterimGoalList)
+        self._initInterimTable(checkedInterimGoalList)
 
         # 2. learn Roadmap
-        self._learnRoadmap(config["ntry"])
+        if not multiQuery:
+            self._learnRoadmap(config["ntry"])
+            self._rememberRoadmap(roadmapParameters)
+
+        # connect the new terminals to the existing roadmap, it is only extended, if this is not sufficient
+        elif not self._attachTerminals():
+            self._learnRoadmap(config["ntry"])
         
         # 3. Find solution path
         try:
             
+            # Visit the interims in the order of the shortest tour through the roadmap
+            if config.get("tourPlanning", False):
+                return self._planTourPath(len(checkedInterimGoalList), config)
+
             # Calculate shortest distance to nearest interim from start 
             result_interim = self._nearestInterim(checkedStartList[0], checkedInterimGoalList)
             
@@ -300,6 +365,9 @@ class VisPRM(PRMBase):
 
                         break
             
+            # Remove loops, the first visits of start and interims are kept
+            path = removeLoops(path, fixed=["start"] + ["interim" + str(i) for i in range(len(interimGoalList))])
+
             HelperClass.HelperClass.printInColor("Solution =  " + str(path), 'lawngreen')
 
         except Exception as e :